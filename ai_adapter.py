@@ -1,32 +1,112 @@
+import asyncio
+from typing import Optional
 from alkemio_virtual_contributor_engine import Input, Response, setup_logger
-from utils import (
-    history_as_conversation,
-    history_as_dict,
-)
-from prompt_graph import PromptGraph
+from utils import collection_fingerprint, knowledge_collection_name
+from answer_cache import SemanticAnswerCache
+from config import config
+from embeddings import embed_query
+from history import prepare_history
+from instrumentation import start_request_trace, timed
+from prompt_graph import CompiledGraphCache, graph_hash, start_speculative_retrieval
+from streaming import ChunkHandler, astream_graph, final_node_names
 
 
 logger = setup_logger(__name__)
 
+compiled_graphs = CompiledGraphCache(config["graph_cache_size"])
 
-async def invoke(input: Input) -> Response:
+answer_cache = None
+if config["semantic_cache_enabled"]:
+    answer_cache = SemanticAnswerCache(
+        threshold=config["semantic_cache_threshold"],
+        max_entries=config["semantic_cache_size"],
+        ttl_seconds=config["semantic_cache_ttl"] or None,
+    )
+
+
+def semantic_cache_key(input: Input, graph_key: str, messages: list[dict]):
+    """Return the (namespace, fingerprint, embedding) answer cache key, if cacheable.
+
+    Only single-message conversations are cached: follow-up questions depend on
+    the earlier turns and cannot be answered from another conversation. This
+    is decided on the input history, as trimming it may leave a single message.
+    """
+    if answer_cache is None or len(input.history) != 1:
+        return None
+    try:
+        fingerprint = collection_fingerprint(
+            knowledge_collection_name(input.body_of_knowledge_id)
+        )
+        # the raw question, also embedded by speculative retrieval through the
+        # embedding cache; retrieve itself embeds the rephrased question
+        embedding = embed_query(messages[-1]["content"])
+    except Exception as inst:
+        logger.warning(f"Semantic answer cache unavailable for this request: {inst}")
+        return None
+    return f"{input.body_of_knowledge_id}:{graph_key}", fingerprint, embedding
+
+
+async def invoke(input: Input, on_chunk: Optional[ChunkHandler] = None) -> Response:
+    """Answer the last message of the input conversation with its prompt graph.
+
+    When on_chunk is given, the final answer is also forwarded chunk by chunk
+    while it is being generated.
+    """
+    trace = start_request_trace(input.persona_id)
+    speculation = None
     try:
         if not input.prompt_graph:
             raise Exception("promptGraph is required in Input.")
 
-        prompt_graph = PromptGraph.from_dict(input.prompt_graph)
+        graph_key = graph_hash(input.prompt_graph)
+        history = await prepare_history(input.history)
+        messages = history.messages
 
-        graph = prompt_graph.compile()
-        result = graph.invoke({
-            "messages": history_as_dict(input.history),
-            "conversation": history_as_conversation(input.history),
+        cache_key = None
+        if answer_cache is not None:
+            cache_key = await asyncio.to_thread(semantic_cache_key, input, graph_key, messages)
+            cached = answer_cache.lookup(*cache_key) if cache_key else None
+            if cached is not None:
+                response = cached.model_copy(deep=True)
+                if on_chunk is not None and response.result:
+                    await on_chunk(response.result)
+                return response
+
+        with timed("graph_compile"):
+            # compiling a new graph builds its models and prompts, keep it off the event loop
+            graph = await asyncio.to_thread(
+                compiled_graphs.get_or_compile, input.prompt_graph, True, graph_key
+            )
+        logger.debug(f"Compiled graph cache stats: {compiled_graphs.stats()}")
+        state = {
+            "messages": messages,
+            "conversation": history.conversation,
             "bok_id": input.body_of_knowledge_id,
             "description": input.description,
             "display_name": input.display_name,
-        })
+        }
+        if config["speculative_retrieval"] and messages and has_retrieve_node(input.prompt_graph):
+            speculation = start_speculative_retrieval(
+                messages[-1]["content"],
+                input.body_of_knowledge_id,
+                config["speculative_retrieval_threshold"],
+            )
+
+        if on_chunk is None:
+            result = await graph.ainvoke(state)
+        else:
+            result = await astream_graph(
+                graph, state, final_node_names(input.prompt_graph), on_chunk
+            )
 
         json_result = {
-            "result": result.get("final_answer", ""),
+            # graphs may end early when check_input answers or asks for clarification
+            "result": (
+                result.get("final_answer")
+                or result.get("context_answer")
+                or result.get("context_question")
+                or ""
+            ),
             "original_result": result.get("knowledge_answer", ""),
             "human_language": result.get("human_language", "en"),
             "result_language": result.get("knowledge_language", "en"),
@@ -55,17 +135,35 @@ async def invoke(input: Input) -> Response:
                 {doc["source"]: doc for doc in sources}.values()
             )
 
-        return Response(**json_result)
+        logger.debug(f"Request timing breakdown: {trace.summary()}")
+
+        response = Response(**json_result)
+        if cache_key:
+            answer_cache.store(*cache_key, response.model_copy(deep=True))
+        return response
 
     except Exception as inst:
         logger.exception(inst)
-        result = f"{input.display_name} - the Alkemio's VirtualContributor \
+        logger.debug(f"Request timing breakdown: {trace.summary()}")
+        return unavailable_response(input)
+
+    finally:
+        if speculation is not None:
+            speculation.close()
+
+
+def has_retrieve_node(prompt_graph: dict) -> bool:
+    return any(node.get("name") == "retrieve" for node in prompt_graph.get("nodes", []))
+
+
+def unavailable_response(input: Input) -> Response:
+    result = f"{input.display_name} - the Alkemio's VirtualContributor \
         is currently unavailable."
 
-        return Response(
-            **{
-                "result": result,
-                "original_result": result,
-                "sources": [],
-            }
-        )
+    return Response(
+        **{
+            "result": result,
+            "original_result": result,
+            "sources": [],
+        }
+    )
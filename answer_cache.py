@@ -0,0 +1,111 @@
+"""Semantic cache of full expert responses keyed by query embedding."""
+
+import threading
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+
+from alkemio_virtual_contributor_engine import setup_logger
+from cache import LRUCache
+
+logger = setup_logger(__name__)
+
+
+class _Namespace:
+    """Cached answers for one (bok_id, graph hash) pair."""
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.vectors: Optional[np.ndarray] = None
+        self.values: List[Any] = []
+        self.created_at: List[float] = []
+        self.lock = threading.Lock()
+
+
+class SemanticAnswerCache:
+    """Nearest-neighbour cache of responses for near-duplicate questions.
+
+    Entries are grouped in namespaces, one per body of knowledge and prompt
+    graph. A namespace is dropped whenever the fingerprint of its knowledge
+    collection changes, so answers never outlive a re-ingestion.
+
+    Attributes:
+        threshold: Minimum cosine similarity for a cached answer to be reused
+        max_entries: Maximum number of answers kept per namespace
+        ttl_seconds: Optional time after which an answer expires
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_entries: int,
+        ttl_seconds: Optional[float] = None,
+        max_namespaces: int = 128,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._namespaces = LRUCache(max_namespaces)
+
+    def _namespace(self, namespace: str, fingerprint: str) -> _Namespace:
+        entry = self._namespaces.get_or_create(namespace, lambda: _Namespace(fingerprint))
+        if entry.fingerprint != fingerprint:
+            logger.info(f"Knowledge changed for {namespace}, dropping cached answers")
+            entry = _Namespace(fingerprint)
+            self._namespaces.put(namespace, entry)
+        return entry
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, entry: _Namespace) -> None:
+        if not self.ttl_seconds or not entry.values:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        keep = [index for index, created in enumerate(entry.created_at) if created > cutoff]
+        if len(keep) == len(entry.values):
+            return
+        entry.vectors = entry.vectors[keep] if keep else None
+        entry.values = [entry.values[index] for index in keep]
+        entry.created_at = [entry.created_at[index] for index in keep]
+
+    def lookup(self, namespace: str, fingerprint: str, embedding: List[float]) -> Optional[Any]:
+        """Return the cached value closest to embedding if it is similar enough."""
+        entry = self._namespace(namespace, fingerprint)
+        with entry.lock:
+            self._expire(entry)
+            if entry.vectors is None:
+                self.misses += 1
+                return None
+            similarities = entry.vectors @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            logger.info(
+                f"Semantic cache hit for {namespace} with similarity {similarities[best]:.4f}"
+            )
+            return entry.values[best]
+
+    def store(self, namespace: str, fingerprint: str, embedding: List[float], value: Any) -> None:
+        entry = self._namespace(namespace, fingerprint)
+        vector = self._normalize(embedding)[np.newaxis, :]
+        with entry.lock:
+            if entry.vectors is None or entry.vectors.shape[1] != vector.shape[1]:
+                entry.vectors, entry.values, entry.created_at = vector, [], []
+            else:
+                entry.vectors = np.vstack([entry.vectors, vector])
+            entry.values.append(value)
+            entry.created_at.append(time.monotonic())
+            overflow = len(entry.values) - self.max_entries
+            if overflow > 0:
+                entry.vectors = entry.vectors[overflow:]
+                entry.values = entry.values[overflow:]
+                entry.created_at = entry.created_at[overflow:]
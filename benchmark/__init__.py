@@ -0,0 +1,9 @@
+"""Offline benchmark harness for the expert engine.
+
+Runs ai_adapter.invoke against a deterministic fake chat model, fake
+embeddings and an in-memory vector store, so throughput and latency can be
+measured without Azure OpenAI/Mistral or Chroma endpoints.
+
+Example:
+    $ python -m benchmark --requests 200 --concurrency 20 --llm-latency 0.2
+"""
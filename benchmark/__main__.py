@@ -0,0 +1,180 @@
+"""Drive ai_adapter.invoke with fake backends and report latency and throughput.
+
+Usage:
+    $ python -m benchmark --requests 200 --concurrency 20 --llm-latency 0.2 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_GRAPH = ROOT / "prompt_graph" / "prompt.graph.expert.example.json"
+
+# the engine modules read their configuration from the environment at import time
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("EMBEDDINGS_DEPLOYMENT_NAME", "benchmark-embeddings")
+sys.path.insert(0, str(ROOT))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--graph", type=Path, default=DEFAULT_GRAPH, help="prompt graph JSON file")
+    parser.add_argument("--requests", type=int, default=100, help="total number of requests")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=5, help="requests run before measuring")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per LLM call")
+    parser.add_argument(
+        "--embedding-latency", type=float, default=0.01, help="seconds per embeddings call"
+    )
+    parser.add_argument(
+        "--vector-latency", type=float, default=0.005, help="seconds per vector query"
+    )
+    parser.add_argument("--answer-words", type=int, default=40, help="words in generated answers")
+    parser.add_argument(
+        "--documents", type=int, default=200, help="synthetic documents per body of knowledge"
+    )
+    parser.add_argument(
+        "--bodies-of-knowledge", type=int, default=2, help="number of bodies of knowledge"
+    )
+    parser.add_argument("--unique-questions", type=int, default=50, help="distinct questions asked")
+    parser.add_argument("--history", type=int, default=1, help="messages in each conversation")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def install_fakes(args: argparse.Namespace):
+    """Swap the LLMs, embeddings and Chroma clients used by the engine for fakes."""
+    import embeddings
+    import utils
+    from models import model_registry
+    from benchmark.fakes import FakeChatModel, FakeEmbeddings, InMemoryChromaClient
+
+    fake_embeddings = FakeEmbeddings(latency=args.embedding_latency)
+    chroma = InMemoryChromaClient()
+    for index in range(args.bodies_of_knowledge):
+        chroma.seed(
+            f"bok-{index}-knowledge", fake_embeddings, args.documents, latency=args.vector_latency
+        )
+
+    fake_embeddings.calls = 0
+
+    fake_llm = FakeChatModel(latency=args.llm_latency, answer_words=args.answer_words)
+    for profile in model_registry.profiles:
+        model_registry.register(profile, fake_llm)
+    embeddings.openai_embeddings = fake_embeddings
+    utils.chromadb_client = chroma
+    return fake_embeddings
+
+
+def build_inputs(args: argparse.Namespace, graph: Dict[str, Any]) -> List[Any]:
+    from alkemio_virtual_contributor_engine import HistoryItem, Input
+
+    inputs = []
+    for index in range(args.requests + args.warmup):
+        question = f"What does the knowledge base say about topic {index % args.unique_questions}?"
+        history = [
+            HistoryItem(
+                role="human" if turn % 2 == 0 else "assistant", content=f"Earlier message {turn}"
+            )
+            for turn in range(args.history - 1)
+        ] + [HistoryItem(role="human", content=question)]
+        # only the fields read by ai_adapter are needed, skip validating the rest
+        inputs.append(Input.model_construct(
+            persona_id=f"persona-{index % args.bodies_of_knowledge}",
+            body_of_knowledge_id=f"bok-{index % args.bodies_of_knowledge}",
+            display_name="Benchmark expert",
+            description="An expert used for benchmarking",
+            history=history,
+            prompt_graph=graph,
+        ))
+    return inputs
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fake_embeddings = install_fakes(args)
+    import ai_adapter
+
+    graph = json.loads(args.graph.read_text())
+    inputs = build_inputs(args, graph)
+    warmup, measured = inputs[:args.warmup], inputs[args.warmup:]
+
+    for input in warmup:
+        await ai_adapter.invoke(input)
+
+    latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    unavailable = "is currently unavailable"
+
+    async def one(input) -> None:
+        nonlocal failures
+        async with semaphore:
+            started_at = time.perf_counter()
+            response = await ai_adapter.invoke(input)
+            latencies.append(time.perf_counter() - started_at)
+            if unavailable in (response.result or ""):
+                failures += 1
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started_at = time.perf_counter()
+    await asyncio.gather(*(one(input) for input in measured))
+    elapsed = time.perf_counter() - started_at
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "requests": len(measured),
+        "concurrency": args.concurrency,
+        "failures": failures,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(len(measured) / elapsed, 2) if elapsed else 0.0,
+        "latency_seconds": {
+            "mean": round(statistics.fmean(latencies), 4) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50), 4),
+            "p95": round(percentile(latencies, 0.95), 4),
+            "p99": round(percentile(latencies, 0.99), 4),
+            "max": round(max(latencies), 4) if latencies else 0.0,
+        },
+        "max_rss_mb": round(rss_after / 1024, 1),
+        "rss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+        "embedding_calls": fake_embeddings.calls,
+        "graph_cache": ai_adapter.compiled_graphs.stats(),
+    }
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    latency = report["latency_seconds"]
+    print(f"requests:      {report['requests']} (concurrency {report['concurrency']}, "
+          f"failures {report['failures']})")
+    print(f"throughput:    {report['requests_per_second']} req/s")
+    print(f"latency (s):   p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  "
+          f"max {latency['max']}")
+    print(f"memory:        max rss {report['max_rss_mb']} MB (+{report['rss_growth_mb']} MB)")
+    print(f"embeddings:    {report['embedding_calls']} calls")
+    print(f"graph cache:   {report['graph_cache']}")
+
+
+if __name__ == "__main__":
+    main()
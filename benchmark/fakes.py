@@ -0,0 +1,299 @@
+"""Deterministic stand-ins for the LLM, the embeddings model and Chroma."""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+SCHEMA_PATTERN = re.compile(r"```\s*(\{.*?\})\s*```", re.DOTALL)
+WORDS = (
+    "alkemio collaboration space challenge community innovation knowledge "
+    "platform member contribution callout post whiteboard"
+).split()
+
+
+def _filler(seed: str, words: int) -> str:
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    return " ".join(WORDS[digest[index % len(digest)] % len(WORDS)] for index in range(words))
+
+
+def _resolve(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    ref = schema.get("$ref")
+    if not ref:
+        return schema
+    target: Any = root
+    for part in ref.lstrip("#/").split("/"):
+        target = target.get(part, {})
+    return target
+
+
+def sample_from_schema(
+    schema: Dict[str, Any],
+    root: Dict[str, Any],
+    name: str = "",
+    answer_words: int = 40,
+) -> Any:
+    """Build a deterministic instance of a JSON schema, leaving optional fields empty."""
+    schema = _resolve(schema, root)
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return sample_from_schema(options[0], root, name, answer_words) if options else None
+
+    types = schema.get("type", "object")
+    if isinstance(types, list):
+        types = next((value for value in types if value != "null"), "null")
+
+    if types == "object":
+        if "patternProperties" in schema:
+            return {"0": 8, "1": 5, "2": 0}
+        properties = schema.get("properties", {})
+        required = set(schema.get("required", []))
+        return {
+            key: sample_from_schema(value, root, key, answer_words)
+            for key, value in properties.items()
+            if key in required
+        }
+    if types == "array":
+        return [sample_from_schema(schema.get("items", {}), root, name, answer_words)]
+    if types in ("number", "integer"):
+        return 5
+    if types == "boolean":
+        return True
+    if types == "string":
+        if "language" in name:
+            return "en"
+        return _filler(name, answer_words)
+    return None
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model answering every prompt with a schema-conforming JSON object.
+
+    The JSON schema is read from the bound tool when structured output is
+    used, otherwise from the format instructions embedded in the prompt.
+    Latency is simulated per call and spread over the streamed chunks.
+    """
+
+    latency: float = 0.0
+    answer_words: int = 40
+    chunk_size: int = 16
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _respond(
+        self, messages: List[BaseMessage], tools: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        if tools:
+            schema = tools[0]["function"]["parameters"]
+        else:
+            text = "\n".join(str(message.content) for message in messages)
+            match = None
+            for match in SCHEMA_PATTERN.finditer(text):
+                pass
+            schema = json.loads(match.group(1)) if match else {}
+        return json.dumps(sample_from_schema(schema, schema, answer_words=self.answer_words))
+
+    def _message(self, messages: List[BaseMessage], content: str, tools=None) -> AIMessage:
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if tools:
+            tool_call = {
+                "name": tools[0]["function"]["name"], "args": json.loads(content), "id": "call-0"
+            }
+            return AIMessage(content="", tool_calls=[tool_call], usage_metadata=usage_metadata)
+        return AIMessage(content=content, usage_metadata=usage_metadata)
+
+    def _result(self, messages, tools=None) -> ChatResult:
+        content = self._respond(messages, tools)
+        return ChatResult(
+            generations=[ChatGeneration(message=self._message(messages, content, tools))]
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages, tools)
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, tools=None, **kwargs
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages, tools)
+
+    def _chunks(self, content: str, tools=None) -> List[AIMessageChunk]:
+        pieces = [
+            content[index:index + self.chunk_size]
+            for index in range(0, len(content), self.chunk_size)
+        ]
+        if not tools:
+            return [AIMessageChunk(content=piece) for piece in pieces]
+        name = tools[0]["function"]["name"]
+        return [
+            AIMessageChunk(content="", tool_call_chunks=[{
+                "name": name if index == 0 else None,
+                "args": piece,
+                "id": "call-0" if index == 0 else None,
+                "index": 0,
+            }])
+            for index, piece in enumerate(pieces)
+        ]
+
+    def _stream(
+        self, messages, stop=None, run_manager=None, tools=None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        chunks = self._chunks(self._respond(messages, tools), tools)
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, tools=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        chunks = self._chunks(self._respond(messages, tools), tools)
+        for chunk in chunks:
+            await asyncio.sleep(self.latency / len(chunks))
+            yield ChatGenerationChunk(message=chunk)
+
+
+class FakeEmbeddings:
+    """Hash-based embeddings: identical texts always map to the same unit vector."""
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions)
+        return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class InMemoryCollection:
+    """Subset of the Chroma collection API backed by a numpy matrix."""
+
+    def __init__(self, name: str, latency: float = 0.0):
+        self.name = name
+        self.id = uuid.uuid4()
+        self.latency = latency
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._embeddings: Optional[np.ndarray] = None
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if self._embeddings is not None:
+            matrix = np.vstack([self._embeddings, matrix])
+        self._embeddings = matrix
+        self._ids.extend(ids)
+        self._documents.extend(documents)
+        self._metadatas.extend(metadatas)
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def get(self, ids=None, include=None, limit=None, offset=None, **kwargs) -> Dict[str, Any]:
+        if ids is not None:
+            positions = [
+                self._ids.index(document_id) for document_id in ids if document_id in self._ids
+            ]
+            return {
+                "ids": [self._ids[position] for position in positions],
+                "documents": [self._documents[position] for position in positions],
+                "metadatas": [self._metadatas[position] for position in positions],
+            }
+        start = offset or 0
+        end = start + limit if limit else None
+        return {
+            "ids": self._ids[start:end],
+            "documents": self._documents[start:end],
+            "metadatas": self._metadatas[start:end],
+        }
+
+    def query(self, query_embeddings, n_results: int = 4, **kwargs) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        result: Dict[str, List[Any]] = {
+            "ids": [], "documents": [], "metadatas": [], "distances": []
+        }
+        for embedding in query_embeddings:
+            distances = 1 - self._embeddings @ np.asarray(embedding, dtype=np.float32)
+            best = np.argsort(distances)[:n_results]
+            result["ids"].append([self._ids[index] for index in best])
+            result["documents"].append([self._documents[index] for index in best])
+            result["metadatas"].append([self._metadatas[index] for index in best])
+            result["distances"].append([float(distances[index]) for index in best])
+        return result
+
+
+class InMemoryChromaClient:
+    """Chroma client stand-in serving InMemoryCollection instances by name."""
+
+    def __init__(self):
+        self.collections: Dict[str, InMemoryCollection] = {}
+
+    def get_collection(self, name: str, embedding_function=None) -> InMemoryCollection:
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.collections[name]
+
+    def seed(
+        self,
+        name: str,
+        embeddings: FakeEmbeddings,
+        documents: int,
+        words_per_document: int = 300,
+        latency: float = 0.0,
+    ) -> InMemoryCollection:
+        """Create a collection filled with synthetic documents."""
+        collection = InMemoryCollection(name, latency)
+        texts = [_filler(f"{name}-{index}", words_per_document) for index in range(documents)]
+        collection.add(
+            ids=[f"{name}-{index}" for index in range(documents)],
+            embeddings=embeddings.embed_documents(texts),
+            documents=texts,
+            metadatas=[
+                {
+                    "source": f"https://alkem.io/benchmark/{name}/{index}",
+                    "type": "CALLOUT",
+                    "title": f"Document {index}",
+                }
+                for index in range(documents)
+            ],
+        )
+        self.collections[name] = collection
+        return collection
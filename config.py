@@ -2,6 +2,26 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
+
+def parse_retrieval_collections(value: str) -> list[tuple[str, int]]:
+    """Parse RETRIEVAL_COLLECTIONS, comma separated `template:quota` entries."""
+    collections = []
+    for entry in value.split(","):
+        template, _, quota = entry.strip().rpartition(":")
+        try:
+            template.format(bok_id="")
+            valid = bool(template) and quota.isdigit() and int(quota) > 0
+        except (KeyError, IndexError, ValueError):
+            valid = False
+        if not valid:
+            raise ValueError(
+                f"Invalid RETRIEVAL_COLLECTIONS entry '{entry.strip()}', "
+                "expected `template:quota` with a positive quota"
+            )
+        collections.append((template, int(quota)))
+    return collections
+
+
 # TODO use the Env class from the alkemio-virtual-contributor-engine package
 config = {
     "db_host": os.getenv("VECTOR_DB_HOST"),
@@ -22,13 +42,99 @@ config = {
     "rabbitmq_password": os.getenv("RABBITMQ_PASSWORD"),
     "rabbitmq_queue": os.getenv("RABBITMQ_QUEUE"),
     "rabbitmq_result_queue": os.getenv("RABBITMQ_RESULT_QUEUE"),
+    "rabbitmq_event_bus_exchange": os.getenv("RABBITMQ_EVENT_BUS_EXCHANGE"),
+    "rabbitmq_result_routing_key": os.getenv("RABBITMQ_RESULT_ROUTING_KEY"),
+    # streamed answer chunks are routed apart from the final results
+    "rabbitmq_chunk_routing_key": (
+        os.getenv("RABBITMQ_CHUNK_ROUTING_KEY") or "invoke-engine-result-chunk"
+    ),
     "source_website": os.getenv("AI_SOURCE_WEBSITE"),
     "local_path": os.getenv("AI_LOCAL_PATH") or "",
     "history_length": int(os.getenv("HISTORY_LENGTH") or "10"),
+    # tokens of history sent to the graph, 0 only applies history_length
+    "history_token_budget": int(os.getenv("HISTORY_TOKEN_BUDGET") or "0"),
+    # replace trimmed messages with a rolling summary instead of dropping them
+    "history_summary_enabled": (os.getenv("HISTORY_SUMMARY_ENABLED") or "false").lower() == "true",
+    "history_summary_words": int(os.getenv("HISTORY_SUMMARY_WORDS") or "150"),
+    "history_summary_model": os.getenv("HISTORY_SUMMARY_MODEL") or "",
+    "history_summary_cache_size": int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE") or "1024"),
+    "history_summary_cache_ttl": float(os.getenv("HISTORY_SUMMARY_CACHE_TTL") or "86400"),
+    # chat models nodes can name as `model`, comma separated `name=provider:target`
+    "model_profiles": os.getenv("MODEL_PROFILES") or "",
+    "default_model_profile": os.getenv("DEFAULT_MODEL_PROFILE") or "medium",
+    # "parser" puts the JSON schema in node prompts, "structured" uses native structured output
+    "node_output_mode": os.getenv("NODE_OUTPUT_MODE") or "parser",
+    "structured_output_method": os.getenv("STRUCTURED_OUTPUT_METHOD") or "function_calling",
+    # "prefix_cache" sends node prompts as a stable system prefix for provider prompt caching
+    "prompt_layout": os.getenv("PROMPT_LAYOUT") or "inline",
+    # number of compiled prompt graphs kept in memory
+    "graph_cache_size": int(os.getenv("GRAPH_CACHE_SIZE") or "32"),
+    # number of Pydantic models generated from distinct graph schemas kept in memory
+    "schema_model_cache_size": int(os.getenv("SCHEMA_MODEL_CACHE_SIZE") or "256"),
+    # request scheduling
+    "max_concurrent_requests": int(os.getenv("MAX_CONCURRENT_REQUESTS") or "16"),
+    "max_concurrent_requests_per_persona": int(
+        os.getenv("MAX_CONCURRENT_REQUESTS_PER_PERSONA") or "4"
+    ),
+    "request_queue_timeout": float(os.getenv("REQUEST_QUEUE_TIMEOUT") or "60"),
+    # query embedding cache
+    "embedding_cache_size": int(os.getenv("EMBEDDING_CACHE_SIZE") or "1024"),
+    "embedding_cache_ttl": float(os.getenv("EMBEDDING_CACHE_TTL") or "86400"),
+    "embedding_cache_disk": (os.getenv("EMBEDDING_CACHE_DISK") or "false").lower() == "true",
+    "embedding_cache_disk_size": int(os.getenv("EMBEDDING_CACHE_DISK_SIZE") or "100000"),
+    # micro-batching of concurrent embedding requests
+    "embedding_batch_enabled": (os.getenv("EMBEDDING_BATCH_ENABLED") or "false").lower() == "true",
+    "embedding_batch_size": int(os.getenv("EMBEDDING_BATCH_SIZE") or "64"),
+    "embedding_batch_window_ms": float(os.getenv("EMBEDDING_BATCH_WINDOW_MS") or "10"),
+    # seconds a query waits for its batched embedding, 0 waits forever
+    "embedding_batch_timeout": float(os.getenv("EMBEDDING_BATCH_TIMEOUT") or "30"),
+    # vector db collection handles
+    "collection_cache_size": int(os.getenv("COLLECTION_CACHE_SIZE") or "256"),
+    "collection_cache_ttl": float(os.getenv("COLLECTION_CACHE_TTL") or "300"),
+    # seconds a collection's content fingerprint is reused before it is recomputed
+    "collection_fingerprint_ttl": float(os.getenv("COLLECTION_FINGERPRINT_TTL") or "10"),
+    # collections queried on retrieval as `template:quota`, comma separated
+    "retrieval_collections": parse_retrieval_collections(
+        os.getenv("RETRIEVAL_COLLECTIONS") or "{bok_id}-knowledge:4"
+    ),
+    # fuse vector results with a local BM25 index of each collection
+    "hybrid_search_enabled": (os.getenv("HYBRID_SEARCH_ENABLED") or "false").lower() == "true",
+    "hybrid_candidates": int(os.getenv("HYBRID_CANDIDATES") or "20"),
+    "hybrid_rrf_k": int(os.getenv("HYBRID_RRF_K") or "60"),
+    "lexical_index_page_size": int(os.getenv("LEXICAL_INDEX_PAGE_SIZE") or "500"),
+    # re-rank over-fetched candidates locally with BM25 blended with the vector distance
+    "rerank_enabled": (os.getenv("RERANK_ENABLED") or "false").lower() == "true",
+    "rerank_candidates": int(os.getenv("RERANK_CANDIDATES") or "20"),
+    "rerank_lexical_weight": float(os.getenv("RERANK_LEXICAL_WEIGHT") or "0.3"),
+    # token budget for the retrieved context, 0 keeps the top documents as retrieved
+    "context_token_budget": int(os.getenv("CONTEXT_TOKEN_BUDGET") or "0"),
+    "context_candidate_factor": int(os.getenv("CONTEXT_CANDIDATE_FACTOR") or "3"),
+    "context_truncate": (os.getenv("CONTEXT_TRUNCATE") or "true").lower() == "true",
+    # tiktoken encoding used to count context tokens, empty for a fast approximation
+    "context_tokenizer": os.getenv("CONTEXT_TOKENIZER") or "",
+    # semantic cache of full responses for near-duplicate questions
+    "semantic_cache_enabled": (os.getenv("SEMANTIC_CACHE_ENABLED") or "false").lower() == "true",
+    "semantic_cache_threshold": float(os.getenv("SEMANTIC_CACHE_THRESHOLD") or "0.95"),
+    "semantic_cache_size": int(os.getenv("SEMANTIC_CACHE_SIZE") or "256"),
+    "semantic_cache_ttl": float(os.getenv("SEMANTIC_CACHE_TTL") or "3600"),
+    # stream the final answer tokens as result chunks
+    "streaming_enabled": (os.getenv("STREAMING_ENABLED") or "false").lower() == "true",
+    # start retrieval for the raw last message while the first nodes run
+    "speculative_retrieval": (os.getenv("SPECULATIVE_RETRIEVAL") or "false").lower() == "true",
+    "speculative_retrieval_threshold": float(
+        os.getenv("SPECULATIVE_RETRIEVAL_THRESHOLD") or "0.9"
+    ),
+    # compile the warm-up graph and open model and database connections before consuming
+    "startup_warmup": (os.getenv("STARTUP_WARMUP") or "false").lower() == "true",
+    "warmup_graph_path": os.getenv("WARMUP_GRAPH_PATH") or "",
+    "warmup_timeout": float(os.getenv("WARMUP_TIMEOUT") or "30"),
+    # port of the Prometheus /metrics endpoint, 0 disables it
+    "metrics_port": int(os.getenv("METRICS_PORT") or "0"),
 }
 
 local_path = config["local_path"]
 vectordb_path = local_path + os.sep + "vectordb"
+embedding_cache_path = local_path + os.sep + "embedding_cache.sqlite3"
 
 chunk_size = 3000
 # token limit for the completion of the chat model,
@@ -0,0 +1,121 @@
+"""Token-budgeted packing of retrieved documents into the prompt context."""
+
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from alkemio_virtual_contributor_engine import setup_logger
+from cache import LRUCache
+from config import config
+
+logger = setup_logger(__name__)
+
+# characters per token used when no tokenizer is configured or it cannot be loaded
+CHARS_PER_TOKEN = 4
+# remaining budget below which a document is not truncated to fit
+MIN_TRUNCATED_TOKENS = 100
+# share of word shingles two chunks must have in common to be considered overlapping
+OVERLAP_THRESHOLD = 0.8
+SHINGLE_SIZE = 5
+
+token_counts = LRUCache(10000)
+_encoding: Optional[Any] = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and config["context_tokenizer"]:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(config["context_tokenizer"])
+        except Exception as inst:
+            _encoding_failed = True
+            logger.warning(f"Tokenizer unavailable, approximating token counts: {inst}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def chunk_tokens(chunk_id: str, text: str) -> int:
+    """Count the tokens of a retrieved chunk, cached per chunk id."""
+    return token_counts.get_or_create((chunk_id, len(text)), lambda: count_tokens(text))
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:tokens])
+    return text[:tokens * CHARS_PER_TOKEN]
+
+
+def _shingles(text: str) -> Set[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {
+        " ".join(words[index:index + SHINGLE_SIZE])
+        for index in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def _overlaps(shingles: Set[str], selected: List[Set[str]]) -> bool:
+    for other in selected:
+        smallest = min(len(shingles), len(other))
+        if smallest and len(shingles & other) / smallest >= OVERLAP_THRESHOLD:
+            return True
+    return False
+
+
+def pack_documents(
+    docs: Dict[str, Any],
+    token_budget: int,
+    truncate: bool = True,
+) -> Dict[str, Any]:
+    """Select the best retrieved documents that fit in token_budget.
+
+    Documents are taken in rank order, skipping chunks that mostly overlap an
+    already selected one and chunks that do not fit in the remaining budget.
+    When truncate is set, the first document that does not fit is instead cut
+    down to the remaining budget, if enough is left. The result keeps the Chroma
+    result shape and is re-indexed, so `[source:N]` in the combined context
+    and the source_scores keys refer to the same document.
+    """
+    if not docs or not docs.get("ids") or not docs["ids"][0]:
+        return docs
+
+    keys = [key for key in ("ids", "documents", "metadatas", "distances") if docs.get(key)]
+    rows = list(zip(*(docs[key][0] for key in keys)))
+    id_index, document_index = keys.index("ids"), keys.index("documents")
+
+    packed: List[tuple] = []
+    selected_shingles: List[Set[str]] = []
+    remaining = token_budget
+    for row in rows:
+        text = row[document_index] or ""
+        shingles = _shingles(text)
+        if _overlaps(shingles, selected_shingles):
+            continue
+        tokens = chunk_tokens(row[id_index], text)
+        if tokens <= remaining:
+            packed.append(row)
+            selected_shingles.append(shingles)
+            remaining -= tokens
+            continue
+        if truncate and remaining >= MIN_TRUNCATED_TOKENS:
+            row = list(row)
+            row[document_index] = truncate_to_tokens(text, remaining)
+            packed.append(tuple(row))
+            remaining = 0
+            break
+        # a smaller chunk further down may still fit
+
+    logger.info(
+        f"Packed {len(packed)} of {len(rows)} documents in {token_budget - remaining} "
+        f"of {token_budget} tokens"
+    )
+    return {key: [[row[index] for row in packed]] for index, key in enumerate(keys)}
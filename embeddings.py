@@ -0,0 +1,255 @@
+"""Query embedding helpers with an in-process and an optional on-disk cache."""
+
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from alkemio_virtual_contributor_engine import openai_embeddings, setup_logger
+from cache import LRUCache
+from config import config, embedding_cache_path
+from metrics import Histogram
+
+logger = setup_logger(__name__)
+
+embedding_batch_size = Histogram(
+    "expert_embedding_batch_size",
+    "Number of distinct texts sent per embeddings call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+embedding_batch_fill_ratio = Histogram(
+    "expert_embedding_batch_fill_ratio",
+    "Batch size relative to the configured maximum",
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0),
+)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query text so trivially different spellings share a cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def embedding_cache_key(query: str, deployment_name: Optional[str]) -> str:
+    text = f"{deployment_name or ''}\0{normalize_query(query)}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SqliteEmbeddingStore:
+    """On-disk embedding tier stored as float32 blobs in a SQLite database.
+
+    Entries expire after ttl_seconds and the least recently used ones are
+    evicted once more than max_entries are stored.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: Optional[float]):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_accessed_at ON embeddings (accessed_at)"
+            )
+
+    def get(self, key: str) -> Optional[List[float]]:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            vector, created_at = row
+            if self.ttl_seconds and created_at + self.ttl_seconds <= now:
+                self._connection.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                return None
+            self._connection.execute(
+                "UPDATE embeddings SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return array("f", vector).tolist()
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, array("f", embedding).tobytes(), now, now),
+            )
+            if self.ttl_seconds:
+                self._connection.execute(
+                    "DELETE FROM embeddings WHERE created_at <= ?", (now - self.ttl_seconds,)
+                )
+            self._connection.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+class EmbeddingCache:
+    """Two-tier cache of query embeddings keyed by normalized query and deployment.
+
+    Attributes:
+        memory: In-process LRU tier
+        disk: Optional SQLite tier that survives restarts
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[SqliteEmbeddingStore] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[List[float]]:
+        embedding = self.memory.get(key)
+        if embedding is None and self.disk is not None:
+            try:
+                embedding = self.disk.get(key)
+            except sqlite3.Error as inst:
+                logger.error(f"Reading embedding cache {self.disk.path} failed")
+                logger.exception(inst)
+            if embedding is not None:
+                self.memory.put(key, embedding)
+        return embedding
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        self.memory.put(key, embedding)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, embedding)
+            except sqlite3.Error as inst:
+                logger.error(f"Writing embedding cache {self.disk.path} failed")
+                logger.exception(inst)
+
+
+class BatchingEmbedder:
+    """Micro-batches concurrent single-text embedding requests.
+
+    Texts submitted within max_wait_seconds of the first pending one, up to
+    max_batch_size texts, are embedded with a single embed_documents call and
+    the vectors are handed back to the waiting callers. Calls are dispatched
+    on a small thread pool so a slow batch does not hold up collecting the next.
+
+    Attributes:
+        max_batch_size: Maximum number of texts sent in one call
+        max_wait_seconds: Latency budget for collecting a batch
+        timeout: Seconds embed waits for the vector of its text (None waits forever)
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int,
+        max_wait_seconds: float,
+        max_workers: int = 4,
+        timeout: Optional[float] = None,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.timeout = timeout
+        self._pending: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="embeddings"
+        )
+        self._collector: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        """Queue text for embedding; the returned future resolves to its vector."""
+        if self._collector is None:
+            with self._lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(
+                        target=self._collect, name="embedding-batcher", daemon=True
+                    )
+                    self._collector.start()
+        future: Future = Future()
+        self._pending.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result(timeout=self.timeout)
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._embed_batch, batch)
+
+    def _embed_batch(self, batch: List[Tuple[str, Future]]) -> None:
+        waiting: Dict[str, List[Future]] = {}
+        for text, future in batch:
+            waiting.setdefault(text, []).append(future)
+        texts = list(waiting)
+        embedding_batch_size.observe(len(texts))
+        embedding_batch_fill_ratio.observe(len(batch) / self.max_batch_size)
+        try:
+            vectors = openai_embeddings.embed_documents(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(
+                    f"Embeddings provider returned {len(vectors)} vectors for {len(texts)} texts"
+                )
+            for text, vector in zip(texts, vectors):
+                for future in waiting[text]:
+                    future.set_result(vector)
+        except Exception as inst:
+            # never leave a caller waiting on a future nobody resolves
+            for futures in waiting.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(inst)
+
+
+def _build_embedding_cache() -> EmbeddingCache:
+    ttl = config["embedding_cache_ttl"] or None
+    disk = None
+    if config["embedding_cache_disk"]:
+        disk = SqliteEmbeddingStore(
+            embedding_cache_path, config["embedding_cache_disk_size"], ttl
+        )
+    return EmbeddingCache(LRUCache(config["embedding_cache_size"], ttl), disk)
+
+
+embedding_cache = _build_embedding_cache()
+
+embedding_batcher = None
+if config["embedding_batch_enabled"]:
+    embedding_batcher = BatchingEmbedder(
+        config["embedding_batch_size"],
+        config["embedding_batch_window_ms"] / 1000,
+        timeout=config["embedding_batch_timeout"] or None,
+    )
+
+
+def embed_query(query: str) -> List[float]:
+    """Embed a single query, serving repeated questions from the cache."""
+    key = embedding_cache_key(query, config["embeddings_deployment_name"])
+    embedding = embedding_cache.get(key)
+    if embedding is None:
+        if embedding_batcher is not None:
+            embedding = embedding_batcher.embed(query)
+        else:
+            embedding = openai_embeddings.embed_documents([query])[0]
+        embedding_cache.put(key, embedding)
+    return embedding
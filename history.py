@@ -0,0 +1,131 @@
+"""Conversation history trimmed to a token budget, with cached rolling summaries."""
+
+import hashlib
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from alkemio_virtual_contributor_engine import HistoryItem, clear_tags, setup_logger
+from cache import LRUCache
+from config import config
+from context_packer import count_tokens
+from instrumentation import timed
+from models import model_registry
+from prompts import history_summary_prompt
+
+logger = setup_logger(__name__)
+
+# tokens added per message for the role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_ROLE = "system"
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+# rolling summaries keyed by the hash of the summarised history prefix
+history_summaries = LRUCache(
+    config["history_summary_cache_size"], config["history_summary_cache_ttl"] or None
+)
+
+
+class PreparedHistory(BaseModel):
+    """History as passed to the prompt graph.
+
+    Attributes:
+        messages: Kept messages as role/content dicts, led by the summary if any
+        conversation: The same messages formatted as `role: content` lines
+        summarised: Number of older messages replaced by the summary or dropped
+    """
+
+    messages: List[Dict[str, str]]
+    conversation: str
+    summarised: int = 0
+
+
+def prefix_hashes(messages: List[Dict[str, str]]) -> List[str]:
+    """Return the hash of every prefix of messages; entry i covers messages[:i + 1]."""
+    hashes = []
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(f"{message['role']}\0{message['content']}\0".encode("utf-8"))
+        hashes.append(digest.copy().hexdigest())
+    return hashes
+
+
+def format_conversation(messages: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+
+
+def split_history(messages: List[Dict[str, str]], history_length: int, token_budget: int) -> int:
+    """Return the index of the first message kept verbatim.
+
+    At most history_length of the newest messages are kept, fewer if they do
+    not fit token_budget. The last message is always kept.
+    """
+    start = max(0, len(messages) - history_length) if history_length else 0
+    if not token_budget:
+        return start
+    used = 0
+    for index in range(len(messages) - 1, start - 1, -1):
+        used += count_tokens(messages[index]["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if used > token_budget and index < len(messages) - 1:
+            return index + 1
+    return start
+
+
+async def summarise(messages: List[Dict[str, str]]) -> Optional[str]:
+    """Summarise messages, continuing the longest previously summarised prefix."""
+    hashes = prefix_hashes(messages)
+    summary = history_summaries.get(hashes[-1])
+    if summary is not None:
+        return summary
+
+    previous, summarised = "", 0
+    for index in range(len(hashes) - 2, -1, -1):
+        cached = history_summaries.get(hashes[index])
+        if cached is not None:
+            previous, summarised = cached, index + 1
+            break
+
+    prompt = history_summary_prompt.format(
+        previous_summary=previous,
+        conversation=format_conversation(messages[summarised:]),
+        max_words=config["history_summary_words"],
+    )
+    try:
+        with timed("history_summary"):
+            model = model_registry.get(config["history_summary_model"] or None)
+            message = await model.ainvoke(prompt)
+    except Exception as inst:
+        logger.warning(f"Summarising the conversation history failed: {inst}")
+        return previous or None
+    summary = str(message.content).strip()
+    history_summaries.put(hashes[-1], summary)
+    logger.info(
+        f"Summarised {len(messages) - summarised} messages, reused a summary of {summarised}"
+    )
+    return summary
+
+
+async def prepare_history(history: List[HistoryItem]) -> PreparedHistory:
+    """Clean the history once and fit it into HISTORY_LENGTH and HISTORY_TOKEN_BUDGET.
+
+    Older messages are replaced by a rolling summary when
+    HISTORY_SUMMARY_ENABLED is set and dropped otherwise.
+    """
+    messages = [
+        {"role": item.role, "content": clear_tags(item.content)} for item in history
+    ]
+    summary_enabled = config["history_summary_enabled"]
+    token_budget = config["history_token_budget"]
+    if token_budget and summary_enabled:
+        # leave room for the summary itself, at roughly two tokens per word
+        token_budget = max(1, token_budget - config["history_summary_words"] * 2)
+
+    start = split_history(messages, config["history_length"], token_budget)
+    kept = messages[start:]
+    if start and summary_enabled:
+        summary = await summarise(messages[:start])
+        if summary:
+            kept = [{"role": SUMMARY_ROLE, "content": SUMMARY_PREFIX + summary}] + kept
+    if start:
+        logger.debug(f"History trimmed from {len(messages)} to {len(messages) - start} messages")
+    return PreparedHistory(messages=kept, conversation=format_conversation(kept), summarised=start)
@@ -0,0 +1,163 @@
+"""Per-node latency and token accounting for prompt graph runs."""
+
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import Counter, Histogram
+
+node_seconds = Histogram(
+    "expert_graph_node_seconds", "Wall time of prompt graph nodes", ["persona_id", "node"]
+)
+stage_seconds = Histogram(
+    "expert_stage_seconds",
+    "Wall time of request stages outside the graph nodes (graph compile, embedding, vector query)",
+    ["persona_id", "stage"],
+)
+node_tokens = Counter(
+    "expert_graph_node_tokens",
+    "LLM tokens used by prompt graph nodes: prompt, cached_prompt or completion",
+    ["persona_id", "node", "kind"],
+)
+node_retries = Counter(
+    "expert_graph_node_retries", "Retried LLM calls of prompt graph nodes", ["persona_id", "node"]
+)
+node_parse_failures = Counter(
+    "expert_graph_node_parse_failures",
+    "LLM outputs of prompt graph nodes that could not be parsed",
+    ["persona_id", "node"],
+)
+
+node_policy_events = Counter(
+    "expert_graph_node_policy_events",
+    "Call policy interventions on prompt graph nodes: "
+    "timeout, hedge, hedge_won or structured_fallback",
+    ["persona_id", "node", "event"],
+)
+
+
+class RequestTrace:
+    """Timing and token breakdown of a single request."""
+
+    def __init__(self, persona_id: str):
+        self.persona_id = persona_id
+        self.started_at = time.perf_counter()
+        self.entries: List[Dict[str, Any]] = []
+
+    def add(self, name: str, **values: Any) -> None:
+        self.entries.append({"name": name, **values})
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "persona_id": self.persona_id,
+            "total_seconds": round(time.perf_counter() - self.started_at, 4),
+            "steps": self.entries,
+        }
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def start_request_trace(persona_id: Any) -> RequestTrace:
+    """Start collecting the breakdown of the request running in the current context."""
+    trace = RequestTrace(str(persona_id or ""))
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def _persona_id() -> str:
+    trace = _current_trace.get()
+    return trace.persona_id if trace else ""
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the wall time of a request stage such as the embedding call."""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started_at
+        stage_seconds.observe(elapsed, persona_id=_persona_id(), stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds=round(elapsed, 4))
+
+
+def record_usage(node_name: str, message: Any) -> None:
+    """Record prompt and completion tokens from an AI message's usage metadata."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens", 0)
+    completion_tokens = usage.get("output_tokens", 0)
+    # prompt tokens served from the provider's prompt cache, included in prompt_tokens
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    persona_id = _persona_id()
+    node_tokens.inc(prompt_tokens, persona_id=persona_id, node=node_name, kind="prompt")
+    node_tokens.inc(cached_tokens, persona_id=persona_id, node=node_name, kind="cached_prompt")
+    node_tokens.inc(completion_tokens, persona_id=persona_id, node=node_name, kind="completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(
+            f"{node_name}.llm",
+            prompt_tokens=prompt_tokens,
+            cached_prompt_tokens=cached_tokens,
+            completion_tokens=completion_tokens,
+        )
+
+
+def record_retry(node_name: str) -> None:
+    node_retries.inc(persona_id=_persona_id(), node=node_name)
+
+
+def record_parse_failure(node_name: str) -> None:
+    node_parse_failures.inc(persona_id=_persona_id(), node=node_name)
+
+
+def record_policy_event(node_name: str, event: str) -> None:
+    node_policy_events.inc(persona_id=_persona_id(), node=node_name, event=event)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(f"{node_name}.{event}")
+
+
+def _observe_node(node_name: str, started_at: float, failed: bool) -> None:
+    elapsed = time.perf_counter() - started_at
+    node_seconds.observe(elapsed, persona_id=_persona_id(), node=node_name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(node_name, seconds=round(elapsed, 4), failed=failed)
+
+
+def instrument_node(node_name: str, fn: Callable) -> Callable:
+    """Wrap a graph node function, sync or async, to record its wall time."""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(state):
+            started_at = time.perf_counter()
+            failed = True
+            try:
+                result = await fn(state)
+                failed = False
+                return result
+            finally:
+                _observe_node(node_name, started_at, failed)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(state):
+        started_at = time.perf_counter()
+        failed = True
+        try:
+            result = fn(state)
+            failed = False
+            return result
+        finally:
+            _observe_node(node_name, started_at, failed)
+    return wrapper
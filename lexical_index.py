@@ -0,0 +1,289 @@
+"""Persistent BM25 index over the documents of a Chroma collection.
+
+Each index lives in its own directory under `vectordb_path` and holds a
+json term dictionary next to numpy arrays of postings that are memory mapped
+when loaded. Files of a new generation are written first and `index.json`
+is replaced last, so readers always see a complete index.
+"""
+
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from alkemio_virtual_contributor_engine import setup_logger
+from cache import LRUCache
+from reranker import BM25_B, BM25_K1, tokenize
+
+logger = setup_logger(__name__)
+
+MANIFEST = "index.json"
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int = 60
+) -> List[Tuple[str, float]]:
+    """Fuse several rankings of ids, best first, into one ordered by RRF score."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
+
+
+class LexicalIndex:
+    """Read-only, memory mapped BM25 index of one collection.
+
+    Attributes:
+        collection_id: Id of the Chroma collection the index was built from
+        fingerprint: Collection fingerprint at build time
+        ids: Document ids, in indexing order
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        generation = manifest["generation"]
+        self.collection_id: str = manifest["collection_id"]
+        self.fingerprint: str = manifest["fingerprint"]
+        with open(os.path.join(path, f"{generation}.json"), encoding="utf-8") as terms_file:
+            dictionary = json.load(terms_file)
+        self.ids: List[str] = dictionary["ids"]
+        self.terms: Dict[str, List[int]] = dictionary["terms"]
+        self.documents = self._load_array(path, generation, "documents")
+        self.frequencies = self._load_array(path, generation, "frequencies")
+        self.lengths = self._load_array(path, generation, "lengths")
+        self.average_length = float(self.lengths.mean()) if len(self.lengths) else 1.0
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        offset, count = self.terms.get(term, (0, 0))
+        return self.documents[offset:offset + count], self.frequencies[offset:offset + count]
+
+    @staticmethod
+    def _load_array(path: str, generation: str, name: str) -> np.ndarray:
+        return np.load(os.path.join(path, f"{generation}.{name}.npy"), mmap_mode="r")
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """Return up to limit (document id, BM25 score) pairs, best first."""
+        terms = [term for term in set(tokenize(query)) if term in self.terms]
+        if not terms or not self.size:
+            return []
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in terms:
+            documents, frequencies = self.postings(term)
+            idf = np.log(1 + (self.size - len(documents) + 0.5) / (len(documents) + 0.5))
+            frequencies = frequencies.astype(np.float32)
+            relative_lengths = self.lengths[documents] / self.average_length
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * relative_lengths)
+            scores[documents] += idf * frequencies * (BM25_K1 + 1) / (frequencies + length_norm)
+        matching = np.flatnonzero(scores)
+        best = matching[np.argsort(-scores[matching], kind="stable")[:limit]]
+        return [(self.ids[index], float(scores[index])) for index in best]
+
+
+def _kept_documents(
+    index: LexicalIndex, present: set
+) -> Tuple[List[str], List[int], Dict[str, Tuple[List[int], List[int]]]]:
+    """Copy the documents of index whose ids are in present, renumbering their positions."""
+    positions: Dict[int, int] = {}
+    ids: List[str] = []
+    lengths: List[int] = []
+    for position, document_id in enumerate(index.ids):
+        if document_id in present:
+            positions[position] = len(ids)
+            ids.append(document_id)
+            lengths.append(int(index.lengths[position]))
+
+    postings: Dict[str, Tuple[List[int], List[int]]] = {}
+    for term in index.terms:
+        documents, frequencies = index.postings(term)
+        kept = [
+            (positions[document], frequency)
+            for document, frequency in zip(documents.tolist(), frequencies.tolist())
+            if document in positions
+        ]
+        if kept:
+            postings[term] = ([document for document, _ in kept], [count for _, count in kept])
+    return ids, lengths, postings
+
+
+def _add_document(
+    document_id: str,
+    document: str,
+    ids: List[str],
+    lengths: List[int],
+    postings: Dict[str, Tuple[List[int], List[int]]],
+) -> None:
+    tokens = tokenize(document)
+    position = len(ids)
+    ids.append(document_id)
+    lengths.append(len(tokens))
+    term_counts: Dict[str, int] = {}
+    for token in tokens:
+        term_counts[token] = term_counts.get(token, 0) + 1
+    for term, frequency in term_counts.items():
+        documents, frequencies = postings.setdefault(term, ([], []))
+        documents.append(position)
+        frequencies.append(frequency)
+
+
+def _write_index(
+    path: str,
+    collection_id: str,
+    fingerprint: str,
+    ids: List[str],
+    postings: Dict[str, Tuple[List[int], List[int]]],
+    lengths: List[int],
+) -> None:
+    os.makedirs(path, exist_ok=True)
+    generation = uuid.uuid4().hex
+    terms: Dict[str, List[int]] = {}
+    documents: List[int] = []
+    frequencies: List[int] = []
+    for term in sorted(postings):
+        term_documents, term_frequencies = postings[term]
+        terms[term] = [len(documents), len(term_documents)]
+        documents.extend(term_documents)
+        frequencies.extend(term_frequencies)
+
+    arrays = {"documents": documents, "frequencies": frequencies, "lengths": lengths}
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f"{generation}.{name}.npy"), np.asarray(values, dtype=np.int32))
+    with open(os.path.join(path, f"{generation}.json"), "w", encoding="utf-8") as terms_file:
+        json.dump({"ids": ids, "terms": terms}, terms_file)
+
+    manifest = os.path.join(path, MANIFEST)
+    with open(manifest + ".tmp", "w", encoding="utf-8") as manifest_file:
+        json.dump(
+            {"generation": generation, "collection_id": collection_id, "fingerprint": fingerprint},
+            manifest_file,
+        )
+    os.replace(manifest + ".tmp", manifest)
+
+    # memory maps of older generations stay valid after their files are unlinked
+    for name in os.listdir(path):
+        if name != MANIFEST and not name.startswith(generation):
+            os.remove(os.path.join(path, name))
+
+
+class LexicalIndexManager:
+    """Builds, persists and serves the lexical indexes of Chroma collections.
+
+    Builds run on a single background thread and only fetch the documents
+    added since the previous build, unless the collection was re-created or
+    edited in place. Searches never wait for a build: they use the index on disk, if
+    any, and schedule an update when it is out of date.
+
+    Attributes:
+        root: Directory holding one sub-directory per collection
+        page_size: Number of documents fetched from Chroma per request
+    """
+
+    def __init__(self, root: str, page_size: int = 500, max_indexes: int = 128):
+        self.root = root
+        self.page_size = page_size
+        self._indexes = LRUCache(max_indexes)
+        self._building: set = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lexical-index")
+
+    def index_path(self, collection_name: str) -> str:
+        return os.path.join(self.root, collection_name)
+
+    def load(self, collection_name: str) -> Optional[LexicalIndex]:
+        index = self._indexes.get(collection_name)
+        manifest_path = os.path.join(self.index_path(collection_name), MANIFEST)
+        if index is None and os.path.exists(manifest_path):
+            try:
+                index = LexicalIndex(self.index_path(collection_name))
+                self._indexes.put(collection_name, index)
+            except (OSError, ValueError, KeyError) as inst:
+                logger.error(f"Loading lexical index for {collection_name} failed")
+                logger.exception(inst)
+        return index
+
+    def search(
+        self, collection_name: str, collection: Any, fingerprint: str, query: str, limit: int
+    ) -> Optional[List[Tuple[str, float]]]:
+        """Search the index of collection_name, or return None while it is not built yet."""
+        index = self.load(collection_name)
+        if index is None or index.fingerprint != fingerprint:
+            self.schedule_update(collection_name, collection, fingerprint)
+        return index.search(query, limit) if index is not None else None
+
+    def schedule_update(self, collection_name: str, collection: Any, fingerprint: str) -> None:
+        with self._lock:
+            if collection_name in self._building:
+                return
+            self._building.add(collection_name)
+        self._executor.submit(self._update, collection_name, collection, fingerprint)
+
+    def _update(self, collection_name: str, collection: Any, fingerprint: str) -> None:
+        try:
+            self.update(collection_name, collection, fingerprint)
+        except Exception as inst:
+            logger.error(f"Building lexical index for {collection_name} failed")
+            logger.exception(inst)
+        finally:
+            with self._lock:
+                self._building.discard(collection_name)
+
+    def collection_ids(self, collection: Any) -> List[str]:
+        """Return the ids of every document in the collection, paging through Chroma."""
+        ids: List[str] = []
+        while True:
+            page = collection.get(include=[], limit=self.page_size, offset=len(ids))
+            ids.extend(page["ids"])
+            if len(page["ids"]) < self.page_size:
+                return ids
+
+    def update(self, collection_name: str, collection: Any, fingerprint: str) -> None:
+        """Bring the index of collection_name up to date with the collection.
+
+        The indexed ids are compared with the ids in the collection: documents
+        that were removed are dropped and only the added ones are fetched. A
+        changed fingerprint without added or removed ids means documents were
+        edited in place, which triggers a full rebuild, as does a re-created
+        collection.
+        """
+        collection_id = str(collection.id)
+        collection_ids = self.collection_ids(collection)
+        current = self.load(collection_name)
+
+        ids: List[str] = []
+        lengths: List[int] = []
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        removed = 0
+        if current is not None and current.collection_id == collection_id:
+            present = set(collection_ids)
+            indexed = set(current.ids)
+            removed = len(indexed - present)
+            if removed or not present <= indexed:
+                ids, lengths, postings = _kept_documents(current, present)
+
+        known = set(ids)
+        added = [document_id for document_id in collection_ids if document_id not in known]
+        for offset in range(0, len(added), self.page_size):
+            page = collection.get(
+                ids=added[offset:offset + self.page_size], include=["documents"]
+            )
+            for document_id, document in zip(page["ids"], page["documents"]):
+                _add_document(document_id, document or "", ids, lengths, postings)
+
+        _write_index(
+            self.index_path(collection_name), collection_id, fingerprint, ids, postings, lengths
+        )
+        self._indexes.pop(collection_name)
+        logger.info(
+            f"Lexical index for {collection_name} updated: "
+            f"{len(added)} new, {removed} removed, {len(ids)} total"
+        )
@@ -1,6 +1,7 @@
 import os
 import asyncio
-from config import LOG_LEVEL
+import time
+from config import LOG_LEVEL, config
 from alkemio_virtual_contributor_engine.alkemio_vc_engine import (
     setup_logger,
     AlkemioVirtualContributorEngine,
@@ -8,13 +9,27 @@ from alkemio_virtual_contributor_engine.alkemio_vc_engine import (
     Input
 )
 
-import ai_adapter
+from metrics import start_metrics_server
+from scheduler import RequestScheduler, SchedulerOverloaded
+from streaming import ResultChunkPublisher
+from warmup import StartupTimer, warm_up
 
 
 logger = setup_logger(__name__)
 
 logger.info(f"log level {os.path.basename(__file__)}: {LOG_LEVEL}")
 
+scheduler = RequestScheduler(
+    max_concurrency=config["max_concurrent_requests"],
+    max_per_persona=config["max_concurrent_requests_per_persona"],
+    max_wait_seconds=config["request_queue_timeout"],
+)
+
+chunk_publisher = ResultChunkPublisher() if config["streaming_enabled"] else None
+
+# imported in main() so the import time shows up in the startup breakdown
+ai_adapter = None
+
 input_exclude = {}
 if LOG_LEVEL != "DEBUG":
     input_exclude = {"prompt_graph"}
@@ -25,11 +40,34 @@ async def on_request(input: Input) -> Response:
     logger.info(
         f"AiPersonaID={input.persona_id} with VC name `{input.display_name}` invoked."
     )
-    result = await ai_adapter.invoke(input)
+    on_chunk = chunk_publisher.for_input(input) if chunk_publisher else None
+    try:
+        result = await scheduler.run(
+            input.persona_id, lambda: ai_adapter.invoke(input, on_chunk=on_chunk)
+        )
+    except SchedulerOverloaded:
+        result = ai_adapter.unavailable_response(input)
     logger.info(f"LLM result: {result.model_dump()}")
     return result
 
 
+async def main():
+    global ai_adapter
+    timer = StartupTimer()
+    if config["metrics_port"]:
+        await start_metrics_server(config["metrics_port"])
+        logger.info(f"Metrics exposed on port {config['metrics_port']}")
+
+    started_at = time.perf_counter()
+    import ai_adapter
+    timer.record("imports", time.perf_counter() - started_at)
+
+    if config["startup_warmup"]:
+        await warm_up(timer)
+    logger.info(f"Startup timings (seconds): {timer.summary()}")
+    await engine.start()
+
+
 engine = AlkemioVirtualContributorEngine()
 engine.register_handler(on_request)
-asyncio.run(engine.start())
+asyncio.run(main())
@@ -0,0 +1,97 @@
+"""Registry of the chat models prompt graph nodes can be routed to."""
+
+import threading
+from typing import Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+import alkemio_virtual_contributor_engine
+from alkemio_virtual_contributor_engine import setup_logger
+from config import config
+
+logger = setup_logger(__name__)
+
+
+def parse_model_profiles(value: str) -> Dict[str, str]:
+    """Parse MODEL_PROFILES, comma separated `name=provider:target` entries."""
+    profiles = {}
+    for entry in value.split(","):
+        if entry.strip():
+            name, _, spec = entry.strip().partition("=")
+            profiles[name.strip()] = spec.strip()
+    return profiles
+
+
+def build_model(spec: str) -> BaseChatModel:
+    """Build a chat model from a `provider:target` profile specification.
+
+    Providers:
+        engine: a model exported by alkemio_virtual_contributor_engine, e.g.
+                `engine:mistral_medium`
+        azure_openai: an Azure OpenAI chat deployment, e.g. `azure_openai:gpt-4o-mini`
+    """
+    provider, _, target = spec.partition(":")
+    if provider == "engine":
+        return getattr(alkemio_virtual_contributor_engine, target)
+    if provider == "azure_openai":
+        from langchain_openai import AzureChatOpenAI
+        return AzureChatOpenAI(
+            azure_deployment=target,
+            api_version=config["openai_api_version"],
+            azure_endpoint=config["openai_endpoint"],
+            api_key=config["openai_api_key"],
+            temperature=float(config["model_temperature"] or 0),
+        )
+    raise ValueError(f"Unknown model provider '{provider}' in profile '{spec}'")
+
+
+class ModelRegistry:
+    """Chat models by profile name, e.g. `small`, `medium` or `openai`.
+
+    Attributes:
+        default: Profile used by nodes that do not name one
+    """
+
+    def __init__(self, models: Dict[str, BaseChatModel], default: str):
+        if default not in models:
+            raise ValueError(f"Default model profile '{default}' is not configured")
+        self._models = dict(models)
+        self.default = default
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "ModelRegistry":
+        specs = {"medium": "engine:mistral_medium"}
+        if config["llm_deployment_name"]:
+            specs["openai"] = f"azure_openai:{config['llm_deployment_name']}"
+        specs.update(parse_model_profiles(config["model_profiles"]))
+
+        models = {}
+        for name, spec in specs.items():
+            try:
+                models[name] = build_model(spec)
+            except Exception as inst:
+                logger.error(f"Model profile '{name}' ({spec}) could not be built: {inst}")
+        logger.info(f"Model profiles available: {', '.join(models)}")
+        return cls(models, config["default_model_profile"])
+
+    @property
+    def profiles(self) -> List[str]:
+        return list(self._models)
+
+    def register(self, name: str, model: BaseChatModel) -> None:
+        with self._lock:
+            self._models[name] = model
+
+    def get(self, name: Optional[str] = None) -> BaseChatModel:
+        """Return the model of a profile, falling back to the default one if unknown."""
+        if name is None:
+            return self._models[self.default]
+        model = self._models.get(name)
+        if model is None:
+            logger.warning(f"Unknown model profile '{name}', using '{self.default}'")
+            return self._models[self.default]
+        return model
+
+
+model_registry = ModelRegistry.from_config()
@@ -6,6 +6,8 @@ This module provides classes for defining and executing graph-based prompt workf
 - Node: Represents a processing step with LLM interaction
 - Edge: Defines connections between nodes
 - State: Manages data flowing through the graph
+- CompiledGraphCache: LRU cache of compiled graphs keyed by graph hash
+- schema_models: Registry of the Pydantic models generated from graph schemas
 
 Example:
     >>> from pathlib import Path
@@ -17,7 +19,19 @@ from .edge import Edge
 from .prompt_graph import PromptGraph
 from .node import Node
 from .state import State
-from .json_graph_parser import parse_json_graph
+from .json_graph_parser import parse_json_graph, schema_models
+from .graph_cache import CompiledGraphCache, graph_hash
+from .speculative_retrieval import start_speculative_retrieval
 
-__all__ = ["Edge", "PromptGraph", "Node", "State", "parse_json_graph"]
+__all__ = [
+    "Edge",
+    "PromptGraph",
+    "Node",
+    "State",
+    "parse_json_graph",
+    "schema_models",
+    "CompiledGraphCache",
+    "graph_hash",
+    "start_speculative_retrieval",
+]
 __version__ = "0.1.0"
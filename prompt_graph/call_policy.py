@@ -0,0 +1,221 @@
+"""Timeout, retry and hedging policy for the LLM calls of prompt graph nodes."""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Optional
+
+from langchain_core.runnables import RunnableConfig, ensure_config
+from langchain_core.runnables.config import merge_configs
+from pydantic import BaseModel, ConfigDict, Field
+
+from alkemio_virtual_contributor_engine import setup_logger
+from instrumentation import record_policy_event, record_retry
+
+logger = setup_logger(__name__)
+
+# runs sync LLM calls that need a timeout or a hedge; abandoned calls finish in the background
+_sync_executor = ThreadPoolExecutor(thread_name_prefix="llm-call")
+
+# run metadata marking the LLM runs of hedge requests, so streaming can skip them
+HEDGE_METADATA_KEY = "policy_hedge"
+
+
+class CallPolicy(BaseModel):
+    """How a node calls the LLM: per-attempt timeout, retries and hedging.
+
+    Attributes:
+        timeout: Seconds an attempt may take, hedge included (None waits forever)
+        max_retries: Additional attempts after a failed, timed out or unparsable call
+        backoff: Base delay in seconds before a retry, doubled on every retry
+        max_backoff: Upper bound of the retry delay
+        hedge: Send a second request when the first is slower than usual
+        hedge_percentile: Latency percentile of past calls after which to hedge
+        hedge_delay: Hedge delay used until hedge_min_samples calls were observed
+        hedge_min_samples: Calls observed before the percentile is trusted
+    """
+
+    timeout: Optional[float] = Field(None, gt=0)
+    max_retries: int = Field(0, ge=0)
+    backoff: float = Field(0.5, ge=0)
+    max_backoff: float = Field(8.0, ge=0)
+    hedge: bool = False
+    hedge_percentile: float = Field(0.95, gt=0, le=1)
+    hedge_delay: float = Field(5.0, gt=0)
+    hedge_min_samples: int = Field(20, ge=1)
+
+    model_config = ConfigDict(extra="forbid")
+
+    def merged(self, override: Optional["CallPolicy"]) -> "CallPolicy":
+        """Return this policy with the fields explicitly set on override replaced."""
+        if override is None:
+            return self
+        return self.model_copy(update=override.model_dump(exclude_unset=True))
+
+    def backoff_seconds(self, retry: int) -> float:
+        """Full-jitter exponential backoff before the given retry, counted from 1."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (retry - 1)))
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful calls of a node."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class PolicyRunner:
+    """Applies a CallPolicy to the LLM calls of one compiled node.
+
+    Calls receive the RunnableConfig to invoke the LLM with; it carries the
+    callbacks of the current run, also into worker threads, and marks hedge
+    requests with HEDGE_METADATA_KEY.
+
+    Attributes:
+        node_name: Name of the node, used in logs and metrics
+        policy: The policy to apply
+        latencies: Recent call latencies the hedge delay is derived from
+    """
+
+    def __init__(self, node_name: str, policy: CallPolicy):
+        self.node_name = node_name
+        self.policy = policy
+        self.latencies = LatencyWindow()
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < self.policy.hedge_min_samples:
+            return self.policy.hedge_delay
+        return self.latencies.percentile(self.policy.hedge_percentile)
+
+    def _failed(self, attempt: int, inst: Exception) -> None:
+        if isinstance(inst, (asyncio.TimeoutError, FutureTimeoutError)):
+            record_policy_event(self.node_name, "timeout")
+            logger.warning(
+                f"Node '{self.node_name}' LLM call timed out after {self.policy.timeout}s"
+            )
+        else:
+            logger.warning(f"Node '{self.node_name}' LLM call failed: {inst}")
+        if attempt >= self.policy.max_retries:
+            raise inst
+        record_retry(self.node_name)
+
+    @staticmethod
+    def _config(hedge: bool = False) -> RunnableConfig:
+        return merge_configs(ensure_config(), {"metadata": {HEDGE_METADATA_KEY: hedge}})
+
+    def run(self, call: Callable[[RunnableConfig], Any], parse: Callable[[Any], Any]) -> Any:
+        """Call and parse with the policy, blocking the current thread."""
+        for attempt in range(self.policy.max_retries + 1):
+            if attempt:
+                time.sleep(self.policy.backoff_seconds(attempt))
+            try:
+                return parse(self._call(call))
+            except Exception as inst:
+                self._failed(attempt, inst)
+
+    async def arun(
+        self, call: Callable[[RunnableConfig], Awaitable[Any]], parse: Callable[[Any], Any]
+    ) -> Any:
+        """Call and parse with the policy on the running event loop."""
+        for attempt in range(self.policy.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.policy.backoff_seconds(attempt))
+            try:
+                message = await asyncio.wait_for(self._acall(call), self.policy.timeout)
+                return parse(message)
+            except Exception as inst:
+                self._failed(attempt, inst)
+
+    def _call(self, call: Callable[[RunnableConfig], Any]) -> Any:
+        started_at = time.perf_counter()
+        if self.policy.timeout is None and not self.policy.hedge:
+            message = call(self._config())
+        else:
+            deadline = None if self.policy.timeout is None else started_at + self.policy.timeout
+            first = _sync_executor.submit(call, self._config())
+            futures = {first}
+            if self.policy.hedge:
+                done, _ = wait(futures, timeout=self._remaining(self.hedge_delay(), deadline))
+                if not done and not self._expired(deadline):
+                    record_policy_event(self.node_name, "hedge")
+                    futures.add(_sync_executor.submit(call, self._config(hedge=True)))
+            message = self._first_result(first, futures, deadline)
+        self.latencies.add(time.perf_counter() - started_at)
+        return message
+
+    def _first_result(self, first: Future, futures: set, deadline: Optional[float]) -> Any:
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(
+                pending, timeout=self._remaining(None, deadline), return_when=FIRST_COMPLETED
+            )
+            if not done:
+                raise FutureTimeoutError()
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        record_policy_event(self.node_name, "hedge_won")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _acall(self, call: Callable[[RunnableConfig], Awaitable[Any]]) -> Any:
+        started_at = time.perf_counter()
+        if not self.policy.hedge:
+            message = await call(self._config())
+            self.latencies.add(time.perf_counter() - started_at)
+            return message
+
+        first = asyncio.ensure_future(call(self._config()))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if not done:
+                record_policy_event(self.node_name, "hedge")
+                tasks.add(asyncio.ensure_future(call(self._config(hedge=True))))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            record_policy_event(self.node_name, "hedge_won")
+                        self.latencies.add(time.perf_counter() - started_at)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _remaining(delay: Optional[float], deadline: Optional[float]) -> Optional[float]:
+        if deadline is None:
+            return delay
+        remaining = max(0.0, deadline - time.perf_counter())
+        return remaining if delay is None else min(delay, remaining)
+
+    @staticmethod
+    def _expired(deadline: Optional[float]) -> bool:
+        return deadline is not None and time.perf_counter() >= deadline
@@ -0,0 +1,107 @@
+"""Safe boolean expressions over graph state fields for conditional edges.
+
+Conditions use a small subset of Python expression syntax: state field
+names, literals (strings, numbers, True, False, None, lists and tuples),
+`and`, `or`, `not` and comparisons (==, !=, <, <=, >, >=, in, not in,
+is, is not). Fields missing from the state evaluate to None. Anything else,
+such as calls or attribute access, is rejected when the graph is compiled.
+
+Examples:
+    context_answer
+    not context_answer and rephrased_question
+    human_language in ("en", "nl")
+"""
+
+import ast
+import operator
+from typing import Any, Callable, Set
+
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda left, right: left in right,
+    ast.NotIn: lambda left, right: left not in right,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+
+def _state_value(state: Any, name: str) -> Any:
+    if isinstance(state, dict):
+        return state.get(name)
+    return getattr(state, name, None)
+
+
+def _compile(node: ast.AST, expression: str) -> Callable[[Any], Any]:
+    if isinstance(node, ast.Name):
+        name = node.id
+        return lambda state: _state_value(state, name)
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda state: value
+
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        items = [_compile(item, expression) for item in node.elts]
+        return lambda state: tuple(item(state) for item in items)
+
+    if isinstance(node, ast.BoolOp):
+        values = [_compile(value, expression) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda state: all(value(state) for value in values)
+        return lambda state: any(value(state) for value in values)
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile(node.operand, expression)
+        return lambda state: not operand(state)
+
+    if isinstance(node, ast.Compare):
+        left = _compile(node.left, expression)
+        comparators = [_compile(comparator, expression) for comparator in node.comparators]
+        operators = []
+        for op in node.ops:
+            if type(op) not in COMPARISONS:
+                raise ValueError(f"Unsupported comparison in condition `{expression}`")
+            operators.append(COMPARISONS[type(op)])
+
+        def compare(state):
+            current = left(state)
+            for compare_fn, comparator in zip(operators, comparators):
+                other = comparator(state)
+                try:
+                    if not compare_fn(current, other):
+                        return False
+                except TypeError:
+                    # e.g. ordering None against a number
+                    return False
+                current = other
+            return True
+        return compare
+
+    raise ValueError(
+        f"Unsupported syntax `{ast.unparse(node)}` in condition `{expression}`"
+    )
+
+
+def compile_condition(expression: str) -> Callable[[Any], bool]:
+    """Compile a condition expression into a predicate over the graph state.
+
+    Raises:
+        ValueError: If the expression is not valid condition syntax
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as inst:
+        raise ValueError(f"Invalid condition `{expression}`: {inst.msg}") from inst
+    predicate = _compile(tree.body, expression)
+    return lambda state: bool(predicate(state))
+
+
+def condition_fields(expression: str) -> Set[str]:
+    """Return the state field names an expression refers to."""
+    tree = ast.parse(expression.strip(), mode="eval")
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
@@ -10,7 +10,9 @@ class Edge(BaseModel):
     Attributes:
         from_node: The name of the source node (or "START" for graph entry)
         to_node: The name of the destination node (or "END" for graph exit)
-        condition: Optional condition for conditional edges
+        condition: Optional condition over state fields, see conditions.py for the
+                   syntax; the edge is only followed when it holds, and the
+                   unconditional edges of the same source node act as the default
     """
 
     from_node: str = Field(..., alias="from", description="Source node name")
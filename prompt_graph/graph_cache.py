@@ -0,0 +1,49 @@
+"""Content-addressed cache of compiled prompt graphs."""
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from cache import LRUCache
+from .prompt_graph import PromptGraph
+
+
+def graph_hash(data: Dict[str, Any]) -> str:
+    """Return a stable hash of a prompt graph definition.
+
+    The dictionary is canonicalized (sorted keys, compact separators) before
+    hashing so that semantically identical graphs sent with a different key
+    order map to the same entry.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompiledGraphCache(LRUCache):
+    """Bounded LRU cache of compiled LangGraph graphs keyed by graph hash.
+
+    Repeat requests sending the same prompt graph skip building the nodes and
+    compiling the LangGraph StateGraph; the Pydantic models of their schemas
+    are shared across graphs by the schema model registry.
+    """
+
+    def get_or_compile(
+        self,
+        data: Dict[str, Any],
+        use_async: bool = False,
+        graph_key: Optional[str] = None,
+    ):
+        """Return the compiled graph for the given prompt graph definition.
+
+        Args:
+            data: The prompt graph dictionary as received in the Input
+            use_async: Whether to compile the graph for execution with ``ainvoke``
+            graph_key: Precomputed graph_hash(data), if the caller already has it
+
+        Returns:
+            The compiled LangGraph graph
+        """
+        key = (graph_key or graph_hash(data), use_async)
+        return self.get_or_create(
+            key, lambda: PromptGraph.from_dict(data).compile(use_async=use_async)
+        )
@@ -1,10 +1,17 @@
+import copy
+import hashlib
+import json
+import threading
 from pydantic import BaseModel
-from typing import Any, Dict
+from typing import Any, Dict, Type
 from json_schema_to_pydantic import create_model
 
+from cache import LRUCache
+from config import config
+
 
 def _transform_schema(obj: Any) -> None:
-    """In-place transform of the loaded JSON structure.
+    """In-place transform of the loaded JSON structure; callers pass a copy.
 
     Operations (single pass, recursive):
     - If an object has a 'properties' key whose value is a LIST, convert it to a
@@ -78,10 +85,40 @@ The main entry point is the function build_prompt_graph_model().
 """
 
 
-def parse_json_graph(data: Dict[str, Any]) -> BaseModel:
-    _transform_schema(data)
-    model_cls = create_model(data, root_schema=data)
-    return model_cls
+def schema_hash(schema: Dict[str, Any]) -> str:
+    """Return a stable hash of a transformed schema, independent of key order."""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SchemaModelRegistry:
+    """Bounded, process-wide registry of the Pydantic models generated from schemas.
+
+    Graphs of different personas often share output and state schemas while
+    their prompts differ, so models are interned by schema rather than by
+    graph. Models are generated under a lock, once per distinct schema.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.models = LRUCache(max_size)
+        self._lock = threading.Lock()
+
+    def get_or_create(self, schema: Dict[str, Any]) -> Type[BaseModel]:
+        """Return the model of an already transformed schema, generating it on a miss."""
+        key = schema_hash(schema)
+        # lookups only happen when graphs are compiled, a single lock is enough
+        with self._lock:
+            return self.models.get_or_create(key, lambda: create_model(schema, root_schema=schema))
+
+
+schema_models = SchemaModelRegistry(config["schema_model_cache_size"])
+
+
+def parse_json_graph(data: Dict[str, Any]) -> Type[BaseModel]:
+    """Return the Pydantic model of a graph schema, leaving data untouched."""
+    schema = copy.deepcopy(data)
+    _transform_schema(schema)
+    return schema_models.get_or_create(schema)
 
 
-__all__ = ["parse_json_graph"]
+__all__ = ["parse_json_graph", "schema_models"]
@@ -2,6 +2,7 @@
 
 from typing import Any, Callable, Dict, List, Optional, Type
 from pydantic import BaseModel, Field, ConfigDict
+from .call_policy import CallPolicy
 from .json_graph_parser import parse_json_graph
 
 
@@ -21,6 +22,11 @@ class Node(BaseModel):
         prompt: The prompt template string (may contain {variable} placeholders)
         output_schema: JSON schema defining the structure of this node's output
         output_model: Pydantic model class for validating and structuring output
+        policy: Timeout, retry and hedging policy of the LLM call, overriding the
+                graph's policy field by field
+        model: Name of the model profile the node runs on (default profile if unset)
+        output_mode: "parser" or "structured", overriding the graph's output mode
+        prompt_layout: "inline" or "prefix_cache", overriding the graph's prompt layout
     """
 
     name: str = Field(..., description="Unique name for this node")
@@ -39,6 +45,12 @@ class Node(BaseModel):
         exclude=True,  # Don't include in serialization
         description="Pydantic model built from output_schema"
     )
+    policy: Optional[CallPolicy] = Field(None, description="LLM call policy overrides")
+    model: Optional[str] = Field(None, description="Model profile name")
+    output_mode: Optional[str] = Field(None, description="Output mode: 'parser' or 'structured'")
+    prompt_layout: Optional[str] = Field(
+        None, description="Prompt layout: 'inline' or 'prefix_cache'"
+    )
 
     model_config = ConfigDict(
         validate_by_name=True,
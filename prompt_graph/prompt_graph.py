@@ -1,19 +1,34 @@
 """Graph class for managing and executing prompt graphs."""
-from typing import Any, Dict, List, Optional, Type
+import asyncio
+import inspect
+from typing import Any, Dict, List, Optional, Set, Type
 from typing import Callable
 from pydantic import BaseModel, Field, ConfigDict
 
+from .call_policy import CallPolicy, PolicyRunner
+from .conditions import compile_condition, condition_fields
+from .prompt_layout import build_node_prompt
 from .node import Node
 from .edge import Edge
 from .state import State
 from langgraph.graph import StateGraph, START, END
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.exceptions import OutputParserException
 from langchain_core.output_parsers import PydanticOutputParser
-from utils import load_knowledge, combine_documents
-from alkemio_virtual_contributor_engine import mistral_medium as llm, setup_logger
+from config import config
+from instrumentation import instrument_node, record_parse_failure, record_policy_event, record_usage
+from utils import load_knowledge, aload_knowledge, combine_documents
+from .speculative_retrieval import current_speculation
+from alkemio_virtual_contributor_engine import setup_logger
+from models import model_registry
 
 logger = setup_logger(__name__)
 
+# replaces the JSON schema in prompts of structured output nodes,
+# the schema travels with the request
+STRUCTURED_FORMAT_INSTRUCTIONS = (
+    "Respond using the structured output format provided with this request."
+)
+
 
 def retrieve(state: State):
     logger.info('Retrieving information from the knowledge base.')
@@ -26,6 +41,24 @@ def retrieve(state: State):
     logger.info(f'Retrieved knowledge documents: {combined_knowledge_docs}')
     return {"knowledge_docs": knowledge_docs, "combined_knowledge_docs": combined_knowledge_docs}
 
+
+async def aretrieve(state: State):
+    logger.info('Retrieving information from the knowledge base.')
+    last_message = state.rephrased_question or state.messages[-1].content
+    logger.info(f'Retrieving for message: {last_message}')
+
+    knowledge_docs = None
+    speculation = current_speculation(state.bok_id)
+    if speculation is not None:
+        knowledge_docs = await speculation.resolve(last_message)
+    if knowledge_docs is None:
+        knowledge_docs = await aload_knowledge(last_message, state.bok_id)
+    combined_knowledge_docs = combine_documents(knowledge_docs)
+
+    logger.info(f'Retrieved knowledge documents: {combined_knowledge_docs}')
+    return {"knowledge_docs": knowledge_docs, "combined_knowledge_docs": combined_knowledge_docs}
+
+
 class PromptGraph(BaseModel):
     """Represents a complete prompt graph with nodes, edges, and state.
 
@@ -42,16 +75,43 @@ class PromptGraph(BaseModel):
         state_model: Pydantic model class for graph state
     special_nodes: Mapping of node names to callable functions for nodes
                    that require custom processing (default: {"retrieve": retrieve})
+        async_special_nodes: Coroutine counterparts of special_nodes used when the
+                   graph is compiled in async mode (default: {"retrieve": aretrieve})
+        special_node_outputs: State fields written by each special node; the declared
+                   outgoing edges of special nodes missing here are kept when
+                   scheduling by dependencies
+        scheduling: "edges" to run nodes along the declared edges, or "dependencies"
+                    to infer the execution order from the nodes' input variables and
+                    outputs and run independent nodes concurrently
+        policy: Default timeout, retry and hedging policy of the LLM nodes
+        output_mode: Default way LLM nodes produce their output: "parser" to put the
+                     JSON schema in the prompt and parse the reply, or "structured"
+                     to use the model's native structured output
+        prompt_layout: Default layout of the LLM node prompts: "inline" for a single
+                       message, or "prefix_cache" for a stable system message prefix
+                       followed by the per-request parts
     """
 
     nodes: Dict[str, Node] = Field(default_factory=dict, description="Graph nodes by name")
     edges: List[Edge] = Field(default_factory=list, description="Graph edges")
     start_node: str = Field("START", alias="start", description="Starting node name")
     end_node: str = Field("END", alias="end", description="Ending node name")
+    scheduling: str = Field("edges", description="Node scheduling mode: 'edges' or 'dependencies'")
+    policy: CallPolicy = Field(default_factory=CallPolicy, description="Default LLM call policy")
+    output_mode: str = Field("parser", description="Node output mode: 'parser' or 'structured'")
+    prompt_layout: str = Field("inline", description="Prompt layout: 'inline' or 'prefix_cache'")
     special_nodes: Dict[str, Callable] = Field(
         default_factory=lambda: {"retrieve": retrieve},
         description="Mapping of node names to custom callable functions"
     )
+    async_special_nodes: Dict[str, Callable] = Field(
+        default_factory=lambda: {"retrieve": aretrieve},
+        description="Mapping of node names to custom coroutine functions for async mode"
+    )
+    special_node_outputs: Dict[str, Set[str]] = Field(
+        default_factory=lambda: {"retrieve": {"knowledge_docs", "combined_knowledge_docs"}},
+        description="State fields written by the special nodes, used to infer dependencies"
+    )
     state_model: Optional[Type[BaseModel]] = Field(
         None,
         exclude=True,
@@ -93,6 +153,10 @@ class PromptGraph(BaseModel):
             edges=edges,
             start=data.get("start", "START"),
             end=data.get("end", "END"),
+            scheduling=data.get("scheduling", "edges"),
+            policy=data.get("policy") or {},
+            output_mode=data.get("output_mode") or config["node_output_mode"],
+            prompt_layout=data.get("prompt_layout") or config["prompt_layout"],
         )
 
         # Set state model directly (after initialization)
@@ -132,6 +196,23 @@ class PromptGraph(BaseModel):
         if not has_end_edge:
             errors.append(f"No edge to END node ({self.end_node})")
 
+        # Check that conditions parse and only refer to state fields
+        state_fields = set(self.state_model.model_fields) if self.state_model else None
+        for edge in self.edges:
+            if not edge.condition:
+                continue
+            try:
+                compile_condition(edge.condition)
+            except ValueError as inst:
+                errors.append(f"{edge!r}: {inst}")
+                continue
+            if state_fields is not None:
+                unknown = condition_fields(edge.condition) - state_fields
+                if unknown:
+                    errors.append(
+                        f"{edge!r}: condition refers to unknown state fields {sorted(unknown)}"
+                    )
+
         return errors
 
     def visualize(self) -> str:
@@ -158,10 +239,222 @@ class PromptGraph(BaseModel):
 
         return "\n".join(lines)
 
-    def compile(self):
+    def node_outputs(self, node: Node) -> Optional[Set[str]]:
+        """Return the state fields written by a node.
+
+        LLM nodes write the fields of their output schema. Special nodes may
+        write more than they declare, so their outputs come from
+        special_node_outputs; None means they cannot be inferred.
+        """
+        declared = set(node.output_model.model_fields) if node.output_model is not None else set()
+        if node.name not in self.special_nodes and node.name not in self.async_special_nodes:
+            return declared
+        if node.name not in self.special_node_outputs:
+            return None
+        return declared | set(self.special_node_outputs[node.name])
+
+    def infer_dependencies(self) -> Dict[str, Set[str]]:
+        """Infer which nodes each node depends on from input variables and outputs.
+
+        A node depends on every node producing one of its input variables.
+        Input variables no node produces are expected in the initial state.
+        Nodes whose outputs cannot be inferred keep their declared outgoing edges.
+
+        Returns:
+            Mapping of node name to the names of the nodes it depends on
+
+        Raises:
+            ValueError: If a state field is produced by more than one node
+        """
+        producers: Dict[str, str] = {}
+        opaque: Set[str] = set()
+        for name, node in self.nodes.items():
+            outputs = self.node_outputs(node)
+            if outputs is None:
+                opaque.add(name)
+                continue
+            for field in outputs:
+                if field in producers:
+                    raise ValueError(
+                        f"State field '{field}' is produced by both '{producers[field]}' "
+                        f"and '{name}'; dependencies are ambiguous"
+                    )
+                producers[field] = name
+
+        dependencies = {
+            name: {
+                producers[var] for var in node.input_variables
+                if var in producers and producers[var] != name
+            }
+            for name, node in self.nodes.items()
+        }
+        for edge in self.edges:
+            if edge.from_node in opaque and edge.to_node in dependencies:
+                dependencies[edge.to_node].add(edge.from_node)
+        return dependencies
+
+    def _declared_ancestors(self) -> Dict[str, Set[str]]:
+        children: Dict[str, Set[str]] = {name: set() for name in self.nodes}
+        for edge in self.edges:
+            if edge.from_node in children and edge.to_node in self.nodes:
+                children[edge.from_node].add(edge.to_node)
+
+        ancestors: Dict[str, Set[str]] = {name: set() for name in self.nodes}
+        for name in self.nodes:
+            pending = list(children[name])
+            seen: Set[str] = set()
+            while pending:
+                child = pending.pop()
+                if child in seen:
+                    continue
+                seen.add(child)
+                ancestors[child].add(name)
+                pending.extend(children[child])
+        return ancestors
+
+    def validate_dependencies(self, dependencies: Dict[str, Set[str]]) -> List[str]:
+        """Check the inferred dependencies against the declared edges.
+
+        Returns:
+            List of validation error messages (empty if every dependency is
+            already honoured by the declared edges)
+        """
+        errors = []
+        ancestors = self._declared_ancestors()
+        for name, parents in dependencies.items():
+            for parent in sorted(parents):
+                if parent not in ancestors[name]:
+                    errors.append(
+                        f"Node '{name}' reads the output of '{parent}' but the declared "
+                        f"edges do not run '{parent}' before it"
+                    )
+                if name in ancestors[parent] and parent in ancestors[name]:
+                    errors.append(f"Nodes '{name}' and '{parent}' form a cycle")
+        return errors
+
+    def _add_declared_edges(self, compiled_graph: StateGraph) -> None:
+        conditional_sources = []
+        for edge in self.edges:
+            if edge.condition:
+                if edge.from_node not in conditional_sources:
+                    conditional_sources.append(edge.from_node)
+        for edge in self.edges:
+            if edge.from_node in conditional_sources:
+                continue
+            if edge.from_node == "START":
+                compiled_graph.add_edge(START, edge.to_node)
+            elif edge.to_node == "END":
+                compiled_graph.add_edge(edge.from_node, END)
+            else:
+                compiled_graph.add_edge(edge.from_node, edge.to_node)
+        for source in conditional_sources:
+            self._add_conditional_edges(compiled_graph, source)
+
+    def _add_conditional_edges(self, compiled_graph: StateGraph, source: str) -> None:
+        """Route from source along every edge whose condition holds.
+
+        Unconditional edges leaving the same node are the default branch,
+        taken only when no condition holds; without one the graph ends.
+        """
+        def graph_node(name: str) -> str:
+            return {"START": START, "END": END}.get(name, name)
+
+        edges = [edge for edge in self.edges if edge.from_node == source]
+        branches = [
+            (edge.condition, compile_condition(edge.condition), graph_node(edge.to_node))
+            for edge in edges if edge.condition
+        ]
+        defaults = [graph_node(edge.to_node) for edge in edges if not edge.condition] or [END]
+
+        def route(state) -> List[str]:
+            targets = []
+            for condition, predicate, target in branches:
+                if predicate(state) and target not in targets:
+                    logger.debug(f"Condition `{condition}` holds, routing '{source}' to '{target}'")
+                    targets.append(target)
+            return targets or defaults
+
+        destinations = list(dict.fromkeys([target for _, _, target in branches] + defaults))
+        compiled_graph.add_conditional_edges(graph_node(source), route, destinations)
+
+    def _add_dependency_edges(
+        self, compiled_graph: StateGraph, dependencies: Dict[str, Set[str]]
+    ) -> None:
+        """Wire nodes by data dependency: fan out from START, fan in on joins."""
+        # Drop parents already implied through another parent (transitive reduction)
+        ancestors: Dict[str, Set[str]] = {}
+
+        def all_ancestors(name: str) -> Set[str]:
+            if name not in ancestors:
+                ancestors[name] = set()
+                for parent in dependencies[name]:
+                    ancestors[name] |= {parent} | all_ancestors(parent)
+            return ancestors[name]
+
+        has_children: Set[str] = set()
+        for name, parents in dependencies.items():
+            direct = {
+                parent for parent in parents
+                if not any(parent in all_ancestors(other) for other in parents - {parent})
+            }
+            has_children |= direct
+            if not direct:
+                compiled_graph.add_edge(START, name)
+            elif len(direct) == 1:
+                compiled_graph.add_edge(next(iter(direct)), name)
+            else:
+                # waits for all parents before running the node
+                compiled_graph.add_edge(sorted(direct), name)
+
+        for name in self.nodes:
+            if name not in has_children:
+                compiled_graph.add_edge(name, END)
+
+    def _special_node_fn(self, node_name: str, use_async: bool) -> Callable:
+        """Return the callable registered for a special node.
+
+        In async mode the coroutine variant is preferred; a plain function
+        without one is offloaded to a worker thread so it never blocks the
+        event loop.
+        """
+        if not use_async:
+            return self.special_nodes[node_name]
+
+        fn = self.async_special_nodes.get(node_name) or self.special_nodes[node_name]
+        if inspect.iscoroutinefunction(fn):
+            return fn
+
+        async def offloaded_fn(state):
+            return await asyncio.to_thread(fn, state)
+        return offloaded_fn
+
+    def _structured_chain(self, node: Node, model: Any) -> Optional[Any]:
+        """Build the structured output chain of a node, or None if the model lacks support."""
+        prompt = build_node_prompt(
+            node.prompt, node.prompt_layout or self.prompt_layout, append_instructions=False
+        )
+        if "format_instructions" in prompt.input_variables:
+            prompt = prompt.partial(format_instructions=STRUCTURED_FORMAT_INSTRUCTIONS)
+        try:
+            structured_model = model.with_structured_output(
+                node.output_model, method=config["structured_output_method"], include_raw=True
+            )
+        except NotImplementedError:
+            logger.warning(
+                f"Model of node '{node.name}' has no structured output support, "
+                "using the output parser"
+            )
+            return None
+        return prompt | structured_model
+
+    def compile(self, use_async: bool = False):
         """
         Compile the prompt graph into a LangGraph graph instance.
         Registers all nodes and edges, using self.state_model as the state.
+
+        Args:
+            use_async: When True, LLM nodes use ``ainvoke`` and special nodes run
+                       as coroutines, so the graph should be run with ``ainvoke``
         """
 
         # Create LangGraph graph with the state model
@@ -169,27 +462,40 @@ class PromptGraph(BaseModel):
 
         # Register nodes
         for node_name, node in self.nodes.items():
-            if node_name in self.special_nodes:
-                compiled_graph.add_node(node_name, self.special_nodes[node_name])
+            if node_name in self.special_nodes or (
+                use_async and node_name in self.async_special_nodes
+            ):
+                compiled_graph.add_node(
+                    node_name,
+                    instrument_node(node_name, self._special_node_fn(node_name, use_async)),
+                )
                 continue
 
             def make_node_fn(node):
-                def node_fn(state):
-                    # Prepare output parser
-                    parser = PydanticOutputParser(pydantic_object=node.output_model)
-                    format_instructions = parser.get_format_instructions()
-
-                    # Ensure the prompt contains the required output format instructions.
-                    # If missing, append them to the end with two new lines before them.
-                    prompt_text = node.prompt
-                    required_instr = "Output format instructions: {format_instructions}"
-                    if required_instr not in prompt_text:
-                        prompt_text = prompt_text + "\n\n" + required_instr
-
-                    # Prepare prompt template using the (possibly modified) prompt text
-                    prompt = ChatPromptTemplate.from_template(prompt_text)
-                    prompt = prompt.partial(format_instructions=format_instructions)
-
+                # Everything below depends only on the node definition, build it once
+                # at compile time so a request only substitutes variables and calls the LLM.
+                parser = PydanticOutputParser(pydantic_object=node.output_model)
+                format_instructions = parser.get_format_instructions()
+
+                # Ensure the prompt contains the required output format instructions,
+                # appended at the end or to the system prefix depending on the layout.
+                prompt = build_node_prompt(
+                    node.prompt, node.prompt_layout or self.prompt_layout, append_instructions=True
+                )
+                prompt = prompt.partial(format_instructions=format_instructions)
+                # parsed separately from the LLM call to account tokens and parse failures
+                model = model_registry.get(node.model)
+                chain = prompt | model
+                structured_chain = None
+                if (node.output_mode or self.output_mode) == "structured":
+                    structured_chain = self._structured_chain(node, model)
+                runner = PolicyRunner(node.name, self.policy.merged(node.policy))
+                logger.debug(
+                    f"Compiled node '{node.name}' for model profile "
+                    f"'{node.model or model_registry.default}' with prompt: {prompt}"
+                )
+
+                def prepare(state):
                     # Validate all required input variables exist on state
                     missing_vars = [var for var in node.input_variables if not hasattr(state, var)]
                     if missing_vars:
@@ -202,22 +508,93 @@ class PromptGraph(BaseModel):
                     # Prepare input for chain from state (all variables validated)
                     input_dict = {var: getattr(state, var) for var in node.input_variables}
 
-                    logger.debug(f"Invoking node '{node.name}' with prompt: {prompt} and inputs: {input_dict}")
-                    chain = prompt | llm | parser
-                    result = chain.invoke(input_dict)
-                    logger.debug(f"Node '{node.name}' produced result: {result}")
+                    logger.debug(f"Invoking node '{node.name}' with inputs: {input_dict}")
+                    return input_dict
 
+                def parse(message):
+                    record_usage(node.name, message)
+                    try:
+                        result = parser.invoke(message)
+                    except OutputParserException:
+                        record_parse_failure(node.name)
+                        raise
+                    logger.debug(f"Node '{node.name}' produced result: {result}")
                     return result.model_dump()
-                return node_fn
-            compiled_graph.add_node(node_name, make_node_fn(node))
+
+                def parse_structured(output):
+                    record_usage(node.name, output["raw"])
+                    if output["parsed"] is None:
+                        record_parse_failure(node.name)
+                        raise OutputParserException(
+                            f"Node '{node.name}' structured output could not be parsed: "
+                            f"{output['parsing_error']}"
+                        )
+                    logger.debug(f"Node '{node.name}' produced result: {output['parsed']}")
+                    return output["parsed"].model_dump()
+
+                def fall_back(inst):
+                    # timeouts already used up the latency budget, do not spend it twice
+                    if isinstance(inst, TimeoutError):
+                        raise inst
+                    logger.warning(
+                        f"Structured output of node '{node.name}' failed, "
+                        f"falling back to the output parser: {inst}"
+                    )
+                    record_policy_event(node.name, "structured_fallback")
+
+                def node_fn(state):
+                    input_dict = prepare(state)
+                    if structured_chain is not None:
+                        try:
+                            return runner.run(
+                                lambda run_config: structured_chain.invoke(input_dict, run_config),
+                                parse_structured,
+                            )
+                        except Exception as inst:
+                            fall_back(inst)
+                    return runner.run(
+                        lambda run_config: chain.invoke(input_dict, run_config), parse
+                    )
+
+                async def anode_fn(state):
+                    input_dict = prepare(state)
+                    if structured_chain is not None:
+                        try:
+                            return await runner.arun(
+                                lambda run_config: structured_chain.ainvoke(input_dict, run_config),
+                                parse_structured,
+                            )
+                        except Exception as inst:
+                            fall_back(inst)
+                    return await runner.arun(
+                        lambda run_config: chain.ainvoke(input_dict, run_config), parse
+                    )
+                return anode_fn if use_async else node_fn
+            compiled_graph.add_node(node_name, instrument_node(node_name, make_node_fn(node)))
 
         # Add edges
-        for edge in self.edges:
-            if edge.from_node == "START":
-                compiled_graph.add_edge(START, edge.to_node)
-            elif edge.to_node == "END":
-                compiled_graph.add_edge(edge.from_node, END)
+        if self.scheduling == "dependencies" and any(edge.condition for edge in self.edges):
+            logger.warning(
+                "Dependency scheduling does not support conditional edges, "
+                "falling back to the declared edges"
+            )
+            self._add_declared_edges(compiled_graph)
+        elif self.scheduling == "dependencies":
+            try:
+                dependencies = self.infer_dependencies()
+                errors = self.validate_dependencies(dependencies)
+            except ValueError as inst:
+                # e.g. a state field produced by two nodes
+                errors = [str(inst)]
+            if errors:
+                logger.warning(
+                    "Node dependencies cannot be inferred consistently with the declared edges, "
+                    f"falling back to the declared edges: {'; '.join(errors)}"
+                )
+                self._add_declared_edges(compiled_graph)
             else:
-                compiled_graph.add_edge(edge.from_node, edge.to_node)
+                self._add_dependency_edges(compiled_graph, dependencies)
+        else:
+            self._add_declared_edges(compiled_graph)
 
         return compiled_graph.compile()
@@ -0,0 +1,104 @@
+"""Prompt layouts: one templated message, or a stable system prefix for prompt caching.
+
+Providers cache prompts by exact prefix, so in the "prefix_cache" layout a
+node prompt is split into a system message holding everything that does not
+change between calls of the same persona (static instructions, persona
+variables and the output format instructions) and a human message holding
+the rest, starting at the first per-request variable.
+"""
+
+from string import Formatter
+from typing import List, Optional, Set, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+
+INLINE = "inline"
+PREFIX_CACHE = "prefix_cache"
+LAYOUTS = (INLINE, PREFIX_CACHE)
+
+# variables that only change with the persona, they may stay in the cached prefix
+PREFIX_VARIABLES = frozenset({"format_instructions", "display_name", "description"})
+
+FORMAT_INSTRUCTIONS_FIELD = "{format_instructions}"
+REQUIRED_INSTRUCTIONS = "Output format instructions: " + FORMAT_INSTRUCTIONS_FIELD
+FORMAT_INSTRUCTIONS_REFERENCE = "as given in the system message"
+
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def _field(name: str, conversion: Optional[str], format_spec: Optional[str]) -> str:
+    conversion = f"!{conversion}" if conversion else ""
+    format_spec = f":{format_spec}" if format_spec else ""
+    return "{" + name + conversion + format_spec + "}"
+
+
+def _block_start(text: str) -> int:
+    """Return where the paragraph at the end of text starts, 0 if it is the first one.
+
+    A paragraph ending with a colon introduces the next one, e.g. "Conversation:"
+    or "You are given the following:", so it is kept with it.
+    """
+    end = len(text)
+    while True:
+        start = max(text.rfind("\n\n", 0, len(text[:end].rstrip())), 0)
+        if not start or not text[:start].rstrip().endswith(":"):
+            return start
+        end = start
+
+
+def split_prompt(template: str, prefix_variables: Set[str] = PREFIX_VARIABLES) -> Tuple[str, str]:
+    """Split an f-string prompt template before the paragraph of its first per-request variable.
+
+    The paragraph introducing the variable, such as a label or the opening
+    delimiter of a block, stays with it in the rest.
+
+    Returns:
+        The (prefix, rest) templates; rest is empty when the template only uses
+        prefix variables
+    """
+    prefix: List[str] = []
+    rest: List[str] = []
+    for literal, name, format_spec, conversion in Formatter().parse(template):
+        if rest:
+            rest.append(_escape(literal))
+        elif name is not None and name not in prefix_variables:
+            head = "".join(prefix) + _escape(literal)
+            start = _block_start(head)
+            prefix = [head[:start]]
+            rest.append(head[start:])
+        else:
+            prefix.append(_escape(literal))
+        if name is not None:
+            (rest if rest else prefix).append(_field(name, conversion, format_spec))
+    return "".join(prefix).strip(), "".join(rest).strip()
+
+
+def build_node_prompt(
+    prompt_text: str, layout: str, append_instructions: bool
+) -> ChatPromptTemplate:
+    """Build the prompt template of a node in the given layout.
+
+    Args:
+        prompt_text: The node prompt as defined in the graph
+        layout: "inline" or "prefix_cache"
+        append_instructions: Add the output format instructions when the prompt
+                             does not contain them; in the prefix layout they
+                             always end up in the system message
+    """
+    if layout != PREFIX_CACHE:
+        if append_instructions and REQUIRED_INSTRUCTIONS not in prompt_text:
+            prompt_text = prompt_text + "\n\n" + REQUIRED_INSTRUCTIONS
+        return ChatPromptTemplate.from_template(prompt_text)
+
+    system_text, human_text = split_prompt(prompt_text)
+    if FORMAT_INSTRUCTIONS_FIELD in human_text:
+        # the schema is the largest static part, move it to the cached prefix
+        human_text = human_text.replace(FORMAT_INSTRUCTIONS_FIELD, FORMAT_INSTRUCTIONS_REFERENCE)
+        system_text = (system_text + "\n\n" + REQUIRED_INSTRUCTIONS).strip()
+    elif append_instructions and FORMAT_INSTRUCTIONS_FIELD not in system_text:
+        system_text = (system_text + "\n\n" + REQUIRED_INSTRUCTIONS).strip()
+    if not human_text:
+        return ChatPromptTemplate.from_messages([("human", system_text)])
+    return ChatPromptTemplate.from_messages([("system", system_text), ("human", human_text)])
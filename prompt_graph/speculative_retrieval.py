@@ -0,0 +1,104 @@
+"""Speculative knowledge retrieval overlapped with the first graph nodes."""
+
+import asyncio
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from alkemio_virtual_contributor_engine import setup_logger
+from embeddings import embed_query
+from metrics import Counter
+from utils import load_knowledge
+
+logger = setup_logger(__name__)
+
+speculative_outcomes = Counter(
+    "expert_speculative_retrieval",
+    "Outcome of speculative retrievals: reused, requeried or failed",
+    ["outcome"],
+)
+
+
+def cosine_similarity(first: List[float], second: List[float]) -> float:
+    first_vector = np.asarray(first, dtype=np.float32)
+    second_vector = np.asarray(second, dtype=np.float32)
+    norm = np.linalg.norm(first_vector) * np.linalg.norm(second_vector)
+    return float(first_vector @ second_vector / norm) if norm else 0.0
+
+
+class SpeculativeRetrieval:
+    """Retrieval for the raw last message, started before the rephrased question exists.
+
+    Attributes:
+        query: The raw last message the retrieval was started with
+        bok_id: The body of knowledge being queried
+        threshold: Minimum cosine similarity between the raw and the final query
+                   for the speculative documents to be kept
+    """
+
+    def __init__(self, query: str, bok_id: str, threshold: float):
+        self.query = query
+        self.bok_id = bok_id
+        self.threshold = threshold
+        self.task: asyncio.Task = asyncio.create_task(self._retrieve())
+        self._token: Optional[Token] = None
+
+    async def _retrieve(self) -> Tuple[List[float], Dict[str, Any]]:
+        embedding = await asyncio.to_thread(embed_query, self.query)
+        docs = await asyncio.to_thread(load_knowledge, self.query, self.bok_id, embedding)
+        return embedding, docs
+
+    async def resolve(self, query: str) -> Optional[Dict[str, Any]]:
+        """Return the documents for query, reusing the speculative result if close enough.
+
+        Returns None when the speculative retrieval failed, so the caller can
+        fall back to a regular retrieval.
+        """
+        try:
+            embedding, docs = await self.task
+        except Exception as inst:
+            logger.warning(f"Speculative retrieval failed: {inst}")
+            speculative_outcomes.inc(outcome="failed")
+            return None
+
+        if query == self.query:
+            speculative_outcomes.inc(outcome="reused")
+            return docs
+
+        query_embedding = await asyncio.to_thread(embed_query, query)
+        similarity = cosine_similarity(embedding, query_embedding)
+        if similarity >= self.threshold:
+            logger.info(f"Reusing speculative retrieval, query similarity {similarity:.4f}")
+            speculative_outcomes.inc(outcome="reused")
+            return docs
+
+        logger.info(f"Re-querying knowledge, query similarity {similarity:.4f} below threshold")
+        speculative_outcomes.inc(outcome="requeried")
+        return await asyncio.to_thread(load_knowledge, query, self.bok_id, query_embedding)
+
+    def close(self) -> None:
+        """Cancel the retrieval if it is still running and detach it from the context."""
+        self.task.cancel()
+        if self._token is not None:
+            _current_speculation.reset(self._token)
+            self._token = None
+
+
+_current_speculation: ContextVar[Optional[SpeculativeRetrieval]] = ContextVar(
+    "speculative_retrieval", default=None
+)
+
+
+def start_speculative_retrieval(query: str, bok_id: str, threshold: float) -> SpeculativeRetrieval:
+    """Start retrieving for query in the background for the graph run in this context."""
+    speculation = SpeculativeRetrieval(query, bok_id, threshold)
+    speculation._token = _current_speculation.set(speculation)
+    return speculation
+
+
+def current_speculation(bok_id: str) -> Optional[SpeculativeRetrieval]:
+    speculation = _current_speculation.get()
+    if speculation is not None and speculation.bok_id == bok_id:
+        return speculation
+    return None
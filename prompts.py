@@ -315,3 +315,24 @@ Conversation:
 Output format instructions:
 {format_instructions}
 """
+
+history_summary_prompt = """
+You are summarising the earlier part of a conversation between a human and an assistant
+so it can be continued without the full transcript.
+Below delimited by '+++' you are provided with the summary of the conversation so far, if any,
+followed by the messages that came after it formatted like:
+```
+human: message content
+assistant: message content
+```
+
++++
+{previous_summary}
+
+{conversation}
++++
+
+Write a concise summary of at most {max_words} words covering the questions the human asked,
+the answers and facts the assistant gave, and anything left open.
+Write the summary in the language of the conversation. Reply with the summary only.
+"""
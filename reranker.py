@@ -0,0 +1,86 @@
+"""Local re-ranking of retrieved documents with BM25 and vector similarity."""
+
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List
+
+from alkemio_virtual_contributor_engine import setup_logger
+
+logger = setup_logger(__name__)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def bm25_scores(query: str, documents: List[str]) -> List[float]:
+    """Score documents against query with BM25, using the documents themselves as corpus."""
+    terms = set(tokenize(query))
+    tokenized = [tokenize(document) for document in documents]
+    if not terms or not tokenized:
+        return [0.0] * len(documents)
+
+    average_length = sum(len(tokens) for tokens in tokenized) / len(tokenized) or 1.0
+    document_frequency = Counter(term for tokens in tokenized for term in set(tokens) & terms)
+    scores = []
+    for tokens in tokenized:
+        frequencies = Counter(tokens)
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / average_length)
+        score = 0.0
+        for term in terms:
+            frequency = frequencies.get(term)
+            if not frequency:
+                continue
+            containing = document_frequency[term]
+            idf = math.log(1 + (len(tokenized) - containing + 0.5) / (containing + 0.5))
+            score += idf * frequency * (BM25_K1 + 1) / (frequency + length_norm)
+        scores.append(score)
+    return scores
+
+
+def _min_max(values: List[float]) -> List[float]:
+    low, high = min(values), max(values)
+    if high == low:
+        return [1.0 if high else 0.0] * len(values)
+    return [(value - low) / (high - low) for value in values]
+
+
+def rerank_documents(
+    query: str,
+    docs: Dict[str, Any],
+    top_k: int,
+    lexical_weight: float = 0.3,
+) -> Dict[str, Any]:
+    """Re-order Chroma results by a blend of BM25 and vector similarity.
+
+    Both signals are min-max normalised over the candidates before being
+    combined, lexical_weight being the share given to BM25. The top_k best
+    documents are returned in the Chroma result shape, keeping their
+    original distances.
+    """
+    if not docs or not docs.get("ids") or not docs["ids"][0]:
+        return docs
+
+    keys = [key for key in ("ids", "documents", "metadatas", "distances") if docs.get(key)]
+    rows = list(zip(*(docs[key][0] for key in keys)))
+    documents = [row[keys.index("documents")] or "" for row in rows]
+
+    lexical = _min_max(bm25_scores(query, documents))
+    if "distances" in keys:
+        vector = _min_max([-row[keys.index("distances")] for row in rows])
+    else:
+        vector = _min_max([-float(index) for index in range(len(rows))])
+    scores = [
+        lexical_weight * lexical_score + (1 - lexical_weight) * vector_score
+        for lexical_score, vector_score in zip(lexical, vector)
+    ]
+
+    ranked = sorted(range(len(rows)), key=lambda index: scores[index], reverse=True)[:top_k]
+    logger.debug(f"Re-ranked {len(rows)} candidates, kept {[rows[index][0] for index in ranked]}")
+    return {key: [[rows[index][position] for index in ranked]] for position, key in enumerate(keys)}
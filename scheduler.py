@@ -0,0 +1,151 @@
+"""Bounded concurrency scheduler with per-persona fairness."""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, TypeVar
+
+from alkemio_virtual_contributor_engine import setup_logger
+from metrics import Counter, Gauge, Histogram
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+queue_depth = Gauge(
+    "expert_scheduler_queue_depth", "Requests waiting for a free slot", ["persona_id"]
+)
+running_requests = Gauge(
+    "expert_scheduler_running_requests", "Requests currently being processed"
+)
+queue_wait_seconds = Histogram(
+    "expert_scheduler_queue_wait_seconds", "Time requests spent waiting for a slot"
+)
+shed_requests = Counter(
+    "expert_scheduler_shed_requests", "Requests rejected after waiting too long", ["persona_id"]
+)
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when a request waited longer than the queue deadline."""
+
+
+class RequestScheduler:
+    """Schedules request handlers under a global and a per-persona concurrency cap.
+
+    Waiting requests are queued per persona and free slots are granted
+    round-robin across personas, so one busy persona cannot starve the others.
+    A request that waits longer than max_wait_seconds is rejected with
+    SchedulerOverloaded instead of being run late.
+
+    Attributes:
+        max_concurrency: Maximum number of requests running at once
+        max_per_persona: Maximum number of requests running at once for one persona
+        max_wait_seconds: Queue deadline after which a waiting request is shed
+    """
+
+    def __init__(self, max_concurrency: int, max_per_persona: int, max_wait_seconds: float):
+        self.max_concurrency = max_concurrency
+        self.max_per_persona = max_per_persona
+        self.max_wait_seconds = max_wait_seconds
+        # persona_id -> waiting futures; order of the dict is the round-robin order
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._running: Dict[str, int] = {}
+        self._running_total = 0
+
+    async def run(self, persona_id: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn once a slot is available for persona_id.
+
+        Raises:
+            SchedulerOverloaded: If no slot was granted within max_wait_seconds
+        """
+        persona_id = str(persona_id)
+        await self._acquire(persona_id)
+        try:
+            return await fn()
+        finally:
+            self._release(persona_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": self._running_total,
+            "waiting": sum(len(waiting) for waiting in self._waiting.values()),
+            "personas_waiting": len(self._waiting),
+        }
+
+    async def _acquire(self, persona_id: str) -> None:
+        enqueued_at = time.monotonic()
+        granted = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(persona_id, deque()).append(granted)
+        queue_depth.inc(persona_id=persona_id)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), timeout=self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as error:
+            if granted.done() and not granted.cancelled():
+                # the slot was granted while timing out, hand it back unless we proceed
+                if isinstance(error, asyncio.CancelledError):
+                    self._release(persona_id)
+                    raise
+            else:
+                granted.cancel()
+                self._remove_waiting(persona_id, granted)
+                if isinstance(error, asyncio.CancelledError):
+                    raise
+                shed_requests.inc(persona_id=persona_id)
+                queue_wait_seconds.observe(time.monotonic() - enqueued_at)
+                logger.warning(
+                    f"Request for AiPersonaID={persona_id} shed after waiting "
+                    f"{self.max_wait_seconds}s; scheduler stats: {self.stats()}"
+                )
+                raise SchedulerOverloaded(
+                    f"No free slot for persona {persona_id} within {self.max_wait_seconds}s"
+                )
+
+        queue_wait_seconds.observe(time.monotonic() - enqueued_at)
+
+    def _remove_waiting(self, persona_id: str, granted: asyncio.Future) -> None:
+        waiting = self._waiting.get(persona_id)
+        if waiting is None:
+            return
+        try:
+            waiting.remove(granted)
+            queue_depth.dec(persona_id=persona_id)
+        except ValueError:
+            pass
+        if not waiting:
+            del self._waiting[persona_id]
+
+    def _release(self, persona_id: str) -> None:
+        self._running_total -= 1
+        self._running[persona_id] -= 1
+        if not self._running[persona_id]:
+            del self._running[persona_id]
+        running_requests.dec()
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant free slots to waiting requests, round-robin across personas."""
+        while self._running_total < self.max_concurrency:
+            persona_id = next(
+                (
+                    persona_id for persona_id in self._waiting
+                    if self._running.get(persona_id, 0) < self.max_per_persona
+                ),
+                None,
+            )
+            if persona_id is None:
+                return
+
+            waiting = self._waiting.pop(persona_id)
+            granted = waiting.popleft()
+            queue_depth.dec(persona_id=persona_id)
+            if waiting:
+                # re-append so the persona moves to the back of the rotation
+                self._waiting[persona_id] = waiting
+
+            self._running_total += 1
+            self._running[persona_id] = self._running.get(persona_id, 0) + 1
+            running_requests.inc()
+            granted.set_result(None)
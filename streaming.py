@@ -0,0 +1,177 @@
+"""Streaming of the final answer tokens while a prompt graph runs."""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+import aio_pika
+from langchain_core.utils.json import parse_partial_json
+
+from alkemio_virtual_contributor_engine import Input, setup_logger
+from config import config
+from prompt_graph.call_policy import HEDGE_METADATA_KEY
+
+logger = setup_logger(__name__)
+
+# called with the next piece of the answer, or with replace=True and the whole
+# answer so far when the text streamed before must be discarded
+ChunkHandler = Callable[..., Awaitable[None]]
+
+# AMQP message type of the published chunks
+CHUNK_MESSAGE_TYPE = "result-chunk"
+
+
+def final_node_names(prompt_graph: Dict[str, Any]) -> set[str]:
+    """Return the names of the nodes connected to the end of a prompt graph."""
+    end = prompt_graph.get("end", "END")
+    return {
+        edge["from"] for edge in prompt_graph.get("edges", []) if edge.get("to") == end
+    }
+
+
+def _chunk_text(chunk: Any) -> str:
+    content = chunk.content
+    if not content:
+        # structured output nodes stream their JSON as tool call arguments
+        content = "".join(
+            tool_call.get("args") or ""
+            for tool_call in getattr(chunk, "tool_call_chunks", [])
+        )
+    return content if isinstance(content, str) else ""
+
+
+async def astream_graph(
+    graph,
+    state: Dict[str, Any],
+    final_nodes: Iterable[str],
+    on_chunk: ChunkHandler,
+    answer_field: str = "final_answer",
+) -> Dict[str, Any]:
+    """Run a compiled graph, forwarding the final answer as it is generated.
+
+    The final nodes produce JSON, as content or as structured output tool call
+    arguments, so their token stream is parsed as partial JSON and only newly
+    generated text of answer_field is passed to on_chunk.
+
+    Only one LLM run per node is streamed at a time. Hedge requests are never
+    streamed; a later run of the node (a retry, or the output parser fallback
+    of a failed structured output call) replaces the run streamed so far, and
+    the streamed text is reset. Once the graph finished, a streamed answer that
+    differs from the final one, e.g. because a hedge request won, is replaced.
+
+    Returns:
+        The final graph state, like ``graph.ainvoke`` would
+    """
+    final_nodes = set(final_nodes)
+    current_runs: Dict[str, str] = {}
+    abandoned_runs: set[str] = set()
+    buffers: Dict[str, str] = {}
+    streamed = ""
+    result: Dict[str, Any] = {}
+
+    async for event in graph.astream_events(state, version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_stream":
+            metadata = event.get("metadata", {})
+            node = metadata.get("langgraph_node")
+            run_id = event["run_id"]
+            if node not in final_nodes or metadata.get(HEDGE_METADATA_KEY):
+                continue
+            if run_id in abandoned_runs:
+                continue
+            if current_runs.setdefault(node, run_id) != run_id:
+                # the node started over, what was streamed of the previous run is void
+                abandoned_runs.add(current_runs[node])
+                current_runs[node] = run_id
+                if streamed:
+                    streamed = ""
+                    await on_chunk("", replace=True)
+            content = _chunk_text(event["data"]["chunk"])
+            if not content:
+                continue
+            buffers[run_id] = buffers.get(run_id, "") + content
+            partial = parse_partial_json(buffers[run_id])
+            answer = partial.get(answer_field) if isinstance(partial, dict) else None
+            if not isinstance(answer, str) or not answer.startswith(streamed):
+                continue
+            if len(answer) > len(streamed):
+                previous, streamed = streamed, answer
+                await on_chunk(answer[len(previous):])
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            result = event["data"].get("output") or {}
+
+    answer = result.get(answer_field) if isinstance(result, dict) else None
+    if streamed and isinstance(answer, str) and answer != streamed:
+        await on_chunk(answer, replace=True)
+    return result
+
+
+class ResultChunkPublisher:
+    """Publishes incremental answer chunks to the RabbitMQ event bus.
+
+    Chunks are published with the chunk routing key and the CHUNK_MESSAGE_TYPE
+    message type, apart from the final Response the engine publishes once the
+    handler returns, so consumers of final results never mistake a chunk for
+    the answer. See the README for the message contract.
+    """
+
+    def __init__(self):
+        self._connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self._channel: Optional[aio_pika.abc.AbstractChannel] = None
+        self._exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        # concurrent first chunks must not open a connection each
+        self._connect_lock = asyncio.Lock()
+
+    async def _get_exchange(self) -> aio_pika.abc.AbstractExchange:
+        if self._exchange is not None:
+            return self._exchange
+        async with self._connect_lock:
+            if self._exchange is None:
+                if self._connection is None:
+                    self._connection = await aio_pika.connect_robust(
+                        host=config["rabbitmq_host"],
+                        login=config["rabbitmq_user"],
+                        password=config["rabbitmq_password"],
+                    )
+                if self._channel is None:
+                    self._channel = await self._connection.channel()
+                # the engine declares the event bus exchange, only refer to it here so
+                # its declaration arguments are never contradicted
+                self._exchange = await self._channel.get_exchange(
+                    config["rabbitmq_event_bus_exchange"], ensure=False
+                )
+        return self._exchange
+
+    def for_input(self, input: Input) -> ChunkHandler:
+        """Return a chunk handler publishing the chunks of one request in order."""
+        original = input.model_dump(exclude={"prompt_graph", "history"})
+        sequence = 0
+
+        async def on_chunk(text: str, replace: bool = False) -> None:
+            nonlocal sequence
+            body = {
+                "response": {
+                    "result": text,
+                    "chunk": True,
+                    "sequence": sequence,
+                    # the text replaces all chunks published before
+                    "replace": replace,
+                },
+                "original": original,
+            }
+            sequence += 1
+            try:
+                exchange = await self._get_exchange()
+                await exchange.publish(
+                    aio_pika.Message(
+                        body=json.dumps(body, default=str).encode(),
+                        content_type="application/json",
+                        type=CHUNK_MESSAGE_TYPE,
+                    ),
+                    routing_key=config["rabbitmq_chunk_routing_key"],
+                )
+            except Exception as inst:
+                # streaming is best effort, the full response is still sent at the end
+                logger.warning(f"Publishing result chunk failed: {inst}")
+
+        return on_chunk
@@ -0,0 +1,4 @@
+import os
+
+# config.py requires a valid log level at import time
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,69 @@
+import pytest
+
+import answer_cache
+from answer_cache import SemanticAnswerCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_returns_the_most_similar_answer():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=10)
+    cache.store("bok", "v1", [1.0, 0.0], "east")
+    cache.store("bok", "v1", [0.0, 1.0], "north")
+
+    assert cache.lookup("bok", "v1", [0.1, 2.0]) == "north"
+    assert cache.lookup("bok", "v1", [3.0, 0.2]) == "east"
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_misses_below_the_threshold():
+    cache = SemanticAnswerCache(threshold=0.95, max_entries=10)
+    cache.store("bok", "v1", [1.0, 0.0], "east")
+
+    # cosine similarity of about 0.89
+    assert cache.lookup("bok", "v1", [1.0, 0.5]) is None
+    assert cache.lookup("other", "v1", [1.0, 0.0]) is None
+    assert cache.misses == 2
+
+
+def test_answers_expire_after_ttl(clock):
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=10, ttl_seconds=10)
+    cache.store("bok", "v1", [1.0, 0.0], "old")
+    clock.now += 5
+    cache.store("bok", "v1", [0.0, 1.0], "new")
+
+    clock.now += 5
+    assert cache.lookup("bok", "v1", [1.0, 0.0]) is None
+    assert cache.lookup("bok", "v1", [0.0, 1.0]) == "new"
+
+
+def test_fingerprint_change_drops_the_namespace():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=10)
+    cache.store("bok", "v1", [1.0, 0.0], "stale")
+
+    assert cache.lookup("bok", "v2", [1.0, 0.0]) is None
+    cache.store("bok", "v2", [0.0, 1.0], "fresh")
+    assert cache.lookup("bok", "v2", [1.0, 0.0]) is None
+    assert cache.lookup("bok", "v2", [0.0, 1.0]) == "fresh"
+
+
+def test_keeps_the_newest_entries():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=2)
+    for index, embedding in enumerate(([1.0, 0.0], [0.0, 1.0], [-1.0, 0.0])):
+        cache.store("bok", "v1", embedding, index)
+
+    assert cache.lookup("bok", "v1", [1.0, 0.0]) is None
+    assert cache.lookup("bok", "v1", [-1.0, 0.0]) == 2
@@ -0,0 +1,76 @@
+import pytest
+
+import cache
+from cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def test_evicts_least_recently_used():
+    lru = LRUCache(max_size=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1  # "b" is now the least recently used
+
+    lru.put("c", 3)
+
+    assert "b" not in lru
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+
+def test_put_refreshes_recency():
+    lru = LRUCache(max_size=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    lru.put("a", 10)
+
+    lru.put("c", 3)
+
+    assert lru.get("a") == 10
+    assert "b" not in lru
+
+
+def test_entries_expire_after_ttl(clock):
+    lru = LRUCache(max_size=2, ttl_seconds=10)
+    lru.put("a", 1)
+
+    clock.now += 9.9
+    assert lru.get("a") == 1
+
+    clock.now += 0.1
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+
+def test_get_or_create_rebuilds_expired_entries(clock):
+    lru = LRUCache(max_size=2, ttl_seconds=10)
+    values = iter([1, 2])
+
+    assert lru.get_or_create("a", lambda: next(values)) == 1
+    assert lru.get_or_create("a", lambda: next(values)) == 1
+    clock.now += 10
+    assert lru.get_or_create("a", lambda: next(values)) == 2
+    assert lru.stats()["hits"] == 1
+    assert lru.stats()["misses"] == 2
+
+
+def test_zero_size_disables_caching():
+    lru = LRUCache(max_size=0)
+    lru.put("a", 1)
+
+    assert "a" not in lru
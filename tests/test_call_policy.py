@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+
+from prompt_graph import call_policy
+from prompt_graph.call_policy import HEDGE_METADATA_KEY, CallPolicy, PolicyRunner
+
+
+@pytest.fixture
+def events(monkeypatch):
+    """Record the policy events and retries reported by the runner."""
+    recorded = []
+    monkeypatch.setattr(
+        call_policy, "record_policy_event", lambda node, event: recorded.append(event)
+    )
+    monkeypatch.setattr(call_policy, "record_retry", lambda node: recorded.append("retry"))
+    return recorded
+
+
+def failing_call(failures: int):
+    calls = []
+
+    def call(config):
+        calls.append(config)
+        if len(calls) <= failures:
+            raise RuntimeError(f"failure {len(calls)}")
+        return "answer"
+    return call, calls
+
+
+def test_retries_until_success(events):
+    runner = PolicyRunner("node", CallPolicy(max_retries=2, backoff=0))
+    call, calls = failing_call(2)
+
+    assert runner.run(call, str.upper) == "ANSWER"
+    assert len(calls) == 3
+    assert events == ["retry", "retry"]
+
+
+def test_raises_after_max_retries(events):
+    runner = PolicyRunner("node", CallPolicy(max_retries=1, backoff=0))
+    call, calls = failing_call(3)
+
+    with pytest.raises(RuntimeError, match="failure 2"):
+        runner.run(call, str.upper)
+    assert len(calls) == 2
+    assert events == ["retry"]
+
+
+def test_parse_failures_are_retried(events):
+    runner = PolicyRunner("node", CallPolicy(max_retries=1, backoff=0))
+    replies = iter(["not json", '{"answer": 1}'])
+
+    def parse(message):
+        if not message.startswith("{"):
+            raise ValueError("unparsable")
+        return message
+
+    assert runner.run(lambda config: next(replies), parse) == '{"answer": 1}'
+    assert events == ["retry"]
+
+
+def test_async_timeout_is_retried(events):
+    runner = PolicyRunner("node", CallPolicy(timeout=0.05, max_retries=1, backoff=0))
+    delays = iter([1.0, 0.0])
+
+    async def call(config):
+        await asyncio.sleep(next(delays))
+        return "answer"
+
+    assert asyncio.run(runner.arun(call, str.upper)) == "ANSWER"
+    assert events == ["timeout", "retry"]
+
+
+def test_async_hedge_wins_and_cancels_the_loser(events):
+    runner = PolicyRunner("node", CallPolicy(hedge=True, hedge_delay=0.05))
+    cancelled = []
+
+    async def call(config):
+        hedge = config["metadata"][HEDGE_METADATA_KEY]
+        try:
+            await asyncio.sleep(0 if hedge else 1.0)
+        except asyncio.CancelledError:
+            cancelled.append(hedge)
+            raise
+        return "hedge" if hedge else "primary"
+
+    async def scenario():
+        started_at = time.perf_counter()
+        result = await runner.arun(call, str.upper)
+        return result, time.perf_counter() - started_at
+
+    result, elapsed = asyncio.run(scenario())
+
+    assert result == "HEDGE"
+    assert elapsed < 0.5
+    assert cancelled == [False]
+    assert events == ["hedge", "hedge_won"]
+
+
+def test_async_fast_primary_sends_no_hedge(events):
+    runner = PolicyRunner("node", CallPolicy(hedge=True, hedge_delay=0.5))
+    configs = []
+
+    async def call(config):
+        configs.append(config)
+        return "primary"
+
+    assert asyncio.run(runner.arun(call, str.upper)) == "PRIMARY"
+    assert len(configs) == 1
+    assert events == []
+
+
+def test_sync_hedge_wins(events):
+    runner = PolicyRunner("node", CallPolicy(hedge=True, hedge_delay=0.05))
+
+    def call(config):
+        if not config["metadata"][HEDGE_METADATA_KEY]:
+            time.sleep(0.5)
+            return "primary"
+        return "hedge"
+
+    assert runner.run(call, str.upper) == "HEDGE"
+    assert events == ["hedge", "hedge_won"]
+
+
+def test_hedge_delay_follows_observed_latencies():
+    runner = PolicyRunner(
+        "node", CallPolicy(hedge=True, hedge_delay=5, hedge_min_samples=3, hedge_percentile=0.5)
+    )
+    assert runner.hedge_delay() == 5
+
+    for seconds in (0.1, 0.2, 0.3):
+        runner.latencies.add(seconds)
+
+    assert runner.hedge_delay() == 0.2
+
+
+def test_node_policy_overrides_only_fields_it_sets():
+    graph_policy = CallPolicy(timeout=30, max_retries=2)
+
+    policy = graph_policy.merged(CallPolicy(max_retries=0))
+
+    assert policy.timeout == 30
+    assert policy.max_retries == 0
@@ -0,0 +1,57 @@
+import pytest
+
+from prompt_graph.conditions import compile_condition, condition_fields
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "context_answer.strip",
+        "context_answer.__class__",
+        "len(context_answer)",
+        "__import__('os').system('true')",
+        "messages[0]",
+        "knowledge_docs['documents']",
+        "(lambda: True)()",
+        "[x for x in messages]",
+        "context_answer + 'x'",
+    ],
+)
+def test_rejects_unsupported_syntax(expression):
+    with pytest.raises(ValueError, match="Unsupported"):
+        compile_condition(expression)
+
+
+def test_rejects_invalid_syntax():
+    with pytest.raises(ValueError, match="Invalid condition"):
+        compile_condition("context_answer and")
+
+
+@pytest.mark.parametrize(
+    "expression, state, expected",
+    [
+        ("context_answer", {"context_answer": "yes"}, True),
+        ("context_answer", {"context_answer": ""}, False),
+        ("context_answer", {}, False),
+        ("not context_answer and rephrased_question", {"rephrased_question": "q"}, True),
+        ("human_language in ('en', 'nl')", {"human_language": "nl"}, True),
+        ("human_language not in ['en', 'nl']", {"human_language": "de"}, True),
+        ("score >= 5", {"score": 7}, True),
+        ("score >= 5", {}, False),
+        ("1 < score < 5", {"score": 7}, False),
+        ("context_question is None", {}, True),
+    ],
+)
+def test_evaluates_over_state(expression, state, expected):
+    assert compile_condition(expression)(state) is expected
+
+
+def test_evaluates_over_state_objects():
+    class State:
+        context_answer = "yes"
+
+    assert compile_condition("context_answer == 'yes'")(State()) is True
+
+
+def test_condition_fields():
+    assert condition_fields("not context_answer and score > 5") == {"context_answer", "score"}
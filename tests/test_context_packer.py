@@ -0,0 +1,64 @@
+import pytest
+
+import context_packer
+from cache import LRUCache
+from context_packer import pack_documents
+from utils import combine_documents
+
+
+@pytest.fixture(autouse=True)
+def approximate_tokens(monkeypatch):
+    """Count four characters per token."""
+    monkeypatch.setattr(context_packer, "_get_encoding", lambda: None)
+    monkeypatch.setattr(context_packer, "token_counts", LRUCache(100))
+
+
+def result(*documents):
+    """Chroma result of (id, text) pairs in rank order."""
+    return {
+        "ids": [[document_id for document_id, _ in documents]],
+        "documents": [[text for _, text in documents]],
+        "metadatas": [[{"source": document_id} for document_id, _ in documents]],
+        "distances": [[0.1 * index for index in range(len(documents))]],
+    }
+
+
+def words(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix}{index}" for index in range(count))
+
+
+def test_skips_chunks_overlapping_a_selected_one():
+    text = words("w", 20)
+    docs = result(("a", text), ("b", text + " extra"), ("c", words("v", 20)))
+
+    packed = pack_documents(docs, token_budget=1000)
+
+    assert packed["ids"] == [["a", "c"]]
+
+
+def test_keeps_smaller_chunks_that_fit_after_one_that_does_not():
+    docs = result(("a", "x" * 40), ("b", "y" * 400), ("c", "z" * 40))
+
+    packed = pack_documents(docs, token_budget=25, truncate=False)
+
+    assert packed["ids"] == [["a", "c"]]
+
+
+def test_truncates_the_first_chunk_that_does_not_fit():
+    docs = result(("a", "x" * 40), ("b", "y" * 1000), ("c", "z" * 40))
+
+    packed = pack_documents(docs, token_budget=150)
+
+    assert packed["ids"] == [["a", "b"]]
+    assert packed["documents"][0][1] == "y" * 560
+
+
+def test_reindexes_sources_of_the_packed_documents():
+    docs = result(("a", "x" * 40), ("b", "y" * 400), ("c", "z" * 40))
+
+    packed = pack_documents(docs, token_budget=25, truncate=False)
+
+    # [source:1] is the document of metadatas[0][1], which source_scores["1"] refers to
+    assert combine_documents(packed) == f"[source:0] {'x' * 40}\n\n[source:1] {'z' * 40}"
+    assert packed["metadatas"] == [[{"source": "a"}, {"source": "c"}]]
+    assert packed["distances"] == [[0.0, 0.2]]
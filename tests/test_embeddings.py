@@ -0,0 +1,83 @@
+import pytest
+
+import embeddings
+from cache import LRUCache
+from config import config
+from embeddings import BatchingEmbedder, EmbeddingCache, SqliteEmbeddingStore
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = CountingEmbeddings()
+    monkeypatch.setattr(embeddings, "openai_embeddings", provider)
+    monkeypatch.setattr(embeddings, "embedding_batcher", None)
+    monkeypatch.setattr(embeddings, "embedding_cache", EmbeddingCache(LRUCache(8)))
+    return provider
+
+
+def test_repeated_queries_are_embedded_once(provider):
+    first = embeddings.embed_query("What is Alkemio?")
+
+    assert embeddings.embed_query("  what is   ALKEMIO? ") == first
+    assert provider.texts == ["What is Alkemio?"]
+
+
+def test_cache_keys_depend_on_the_deployment(monkeypatch, provider):
+    embeddings.embed_query("question")
+    monkeypatch.setitem(config, "embeddings_deployment_name", "another-deployment")
+
+    embeddings.embed_query("question")
+
+    assert provider.texts == ["question", "question"]
+
+
+def test_disk_tier_survives_a_new_memory_tier(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    EmbeddingCache(LRUCache(8), SqliteEmbeddingStore(path, 8, None)).put("key", [0.5, 1.0])
+
+    restarted = EmbeddingCache(LRUCache(8), SqliteEmbeddingStore(path, 8, None))
+
+    assert restarted.get("key") == [0.5, 1.0]
+    assert "key" in restarted.memory
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path, monkeypatch):
+    now = iter(range(1000, 2000))
+    monkeypatch.setattr(embeddings.time, "time", lambda: next(now))
+    store = SqliteEmbeddingStore(str(tmp_path / "embeddings.sqlite"), 2, ttl_seconds=100)
+    store.put("a", [1.0])
+    store.put("b", [2.0])
+    assert store.get("a") == [1.0]
+
+    store.put("c", [3.0])
+
+    assert store.get("b") is None
+    assert store.get("a") == [1.0]
+    assert store.get("c") == [3.0]
+
+
+class ShortEmbeddings:
+    """Provider returning one vector less than the texts it was given."""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] for _ in texts[1:]]
+
+
+def test_batch_with_missing_vectors_fails_every_caller(monkeypatch):
+    monkeypatch.setattr(embeddings, "openai_embeddings", ShortEmbeddings())
+    batcher = BatchingEmbedder(max_batch_size=2, max_wait_seconds=0.5, timeout=5)
+
+    futures = [batcher.submit("first"), batcher.submit("second")]
+
+    for future in futures:
+        with pytest.raises(ValueError, match="returned 1 vectors for 2 texts"):
+            future.result(timeout=5)
@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+from prompt_graph import CompiledGraphCache, graph_hash
+
+EXAMPLE_GRAPH = Path(__file__).parent.parent / "prompt_graph" / "prompt.graph.expert.example.json"
+
+
+def example_graph():
+    return json.loads(EXAMPLE_GRAPH.read_text())
+
+
+def test_graph_hash_ignores_key_order():
+    graph = example_graph()
+    reordered = json.loads(json.dumps(graph, sort_keys=True))
+    reordered = dict(reversed(list(reordered.items())))
+
+    assert graph_hash(reordered) == graph_hash(graph)
+
+
+def test_graph_hash_changes_with_the_definition():
+    graph = example_graph()
+    changed = example_graph()
+    changed["nodes"][0]["prompt"] += " Be brief."
+
+    assert graph_hash(changed) != graph_hash(graph)
+
+
+def test_compiles_each_graph_and_mode_once():
+    cache = CompiledGraphCache(max_size=4)
+    graph = example_graph()
+
+    compiled = cache.get_or_compile(graph)
+
+    assert cache.get_or_compile(example_graph()) is compiled
+    assert cache.get_or_compile(graph, graph_key=graph_hash(graph)) is compiled
+    assert cache.get_or_compile(graph, use_async=True) is not compiled
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["hits"] == 2
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import history
+from cache import LRUCache
+from history import split_history, summarise
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """Count one token per word."""
+    monkeypatch.setattr(history, "count_tokens", lambda text: len(text.split()))
+
+
+def conversation(count: int):
+    return [
+        {"role": "human" if index % 2 == 0 else "assistant", "content": f"message {index}"}
+        for index in range(count)
+    ]
+
+
+@pytest.mark.parametrize(
+    "history_length, token_budget, start",
+    [
+        (10, 0, 0),
+        (2, 0, 3),
+        # each message costs 2 tokens plus the per-message overhead
+        (10, 12, 3),
+        (10, 18, 2),
+        (2, 100, 3),
+    ],
+)
+def test_split_history_fits_length_and_budget(history_length, token_budget, start):
+    assert split_history(conversation(5), history_length, token_budget) == start
+
+
+def test_split_history_always_keeps_the_last_message():
+    messages = conversation(3) + [{"role": "human", "content": "a very long last question"}]
+
+    assert split_history(messages, 10, 1) == 3
+
+
+class SummaryModel:
+    def __init__(self):
+        self.prompts = []
+        self.available = True
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        if not self.available:
+            raise RuntimeError("unavailable")
+        return AIMessage(content=f" summary {len(self.prompts)} ")
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = SummaryModel()
+
+    class Registry:
+        def get(self, profile=None):
+            return model
+
+    monkeypatch.setattr(history, "model_registry", Registry())
+    monkeypatch.setattr(history, "history_summaries", LRUCache(16))
+    return model
+
+
+def test_summarise_continues_the_summary_of_a_prefix(model):
+    messages = conversation(6)
+
+    assert asyncio.run(summarise(messages[:3])) == "summary 1"
+    assert asyncio.run(summarise(messages[:5])) == "summary 2"
+
+    assert "message 2" in model.prompts[0]
+    # the second call only sends the messages after the summarised prefix
+    assert "summary 1" in model.prompts[1]
+    assert "message 2" not in model.prompts[1]
+    assert "message 3" in model.prompts[1] and "message 4" in model.prompts[1]
+
+
+def test_summarise_reuses_the_summary_of_the_same_messages(model):
+    messages = conversation(4)
+
+    first = asyncio.run(summarise(messages))
+
+    assert asyncio.run(summarise(conversation(4))) == first
+    assert len(model.prompts) == 1
+
+
+def test_summarise_falls_back_to_the_previous_summary(model):
+    messages = conversation(5)
+    asyncio.run(summarise(messages[:3]))
+    model.available = False
+
+    assert asyncio.run(summarise(messages)) == "summary 1"
@@ -0,0 +1,155 @@
+import pytest
+
+import utils
+from config import config
+from lexical_index import LexicalIndex, LexicalIndexManager, reciprocal_rank_fusion
+
+
+class Collection:
+    """Subset of the Chroma collection API over an ordered dict of documents."""
+
+    def __init__(self, documents, collection_id="c1"):
+        self.id = collection_id
+        self.documents = dict(documents)
+        self.fetched = []
+
+    def count(self):
+        return len(self.documents)
+
+    def get(self, ids=None, include=None, limit=None, offset=None):
+        if ids is None:
+            start = offset or 0
+            ids = list(self.documents)[start:start + limit if limit else None]
+        ids = [document_id for document_id in ids if document_id in self.documents]
+        if "documents" in (include or []):
+            self.fetched.extend(ids)
+        return {
+            "ids": ids,
+            "documents": [self.documents[document_id] for document_id in ids],
+            "metadatas": [{"source": document_id} for document_id in ids],
+        }
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return LexicalIndexManager(str(tmp_path), page_size=2)
+
+
+def indexed(manager, name="bok"):
+    return LexicalIndex(manager.index_path(name))
+
+
+def test_search_ranks_by_bm25(manager):
+    collection = Collection({
+        "d0": "alkemio spaces and challenges",
+        "d1": "spaces spaces spaces",
+        "d2": "unrelated text",
+    })
+    manager.update("bok", collection, "v1")
+
+    hits = manager.load("bok").search("spaces", 5)
+
+    assert [document_id for document_id, _ in hits] == ["d1", "d0"]
+    assert hits[0][1] > hits[1][1] > 0
+    assert manager.load("bok").search("missing", 5) == []
+
+
+def test_update_only_fetches_added_documents(manager):
+    collection = Collection({f"d{index}": f"document {index}" for index in range(3)})
+    manager.update("bok", collection, "v1")
+    collection.documents["d3"] = "document three"
+    collection.fetched.clear()
+
+    manager.update("bok", collection, "v2")
+
+    assert collection.fetched == ["d3"]
+    assert indexed(manager).ids == ["d0", "d1", "d2", "d3"]
+    assert indexed(manager).fingerprint == "v2"
+
+
+def test_update_drops_removed_documents(manager):
+    collection = Collection({f"d{index}": f"document {index}" for index in range(3)})
+    manager.update("bok", collection, "v1")
+    del collection.documents["d0"]
+    collection.documents["d3"] = "document three"
+    collection.documents["d4"] = "document four"
+    collection.fetched.clear()
+
+    manager.update("bok", collection, "v2")
+
+    index = indexed(manager)
+    assert collection.fetched == ["d3", "d4"]
+    assert index.ids == ["d1", "d2", "d3", "d4"]
+    assert [document_id for document_id, _ in index.search("1 four", 5)] == ["d1", "d4"]
+    assert index.lengths.tolist() == [2, 2, 2, 2]
+
+
+def test_update_rebuilds_documents_edited_in_place(manager):
+    collection = Collection({"d0": "old text", "d1": "other"})
+    manager.update("bok", collection, "v1")
+    collection.documents["d0"] = "new text"
+
+    manager.update("bok", collection, "v2")
+
+    index = indexed(manager)
+    assert index.search("old", 5) == []
+    assert [document_id for document_id, _ in index.search("new", 5)] == ["d0"]
+
+
+def test_update_rebuilds_recreated_collections(manager):
+    manager.update("bok", Collection({"d0": "old text"}), "v1")
+
+    manager.update("bok", Collection({"d1": "new text"}, collection_id="c2"), "v1")
+
+    assert indexed(manager).ids == ["d1"]
+    assert indexed(manager).collection_id == "c2"
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=1)
+
+    assert [item for item, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 2 + 1 / 3)
+    assert fused[2][1] == pytest.approx(1 / 3)
+
+
+@pytest.fixture
+def hybrid(monkeypatch):
+    collection = Collection({"v1": "vector one", "v2": "vector two", "l1": "lexical one"})
+    vector_result = {
+        "ids": [["v1", "v2"]],
+        "documents": [["vector one", "vector two"]],
+        "metadatas": [[{"source": "v1"}, {"source": "v2"}]],
+        "distances": [[0.1, 0.4]],
+    }
+    lexical = {"hits": None}
+
+    class Indexes:
+        def search(self, collection_name, collection, fingerprint, query, limit):
+            return lexical["hits"]
+
+    monkeypatch.setattr(utils, "query_collection", lambda name, embeddings, n: vector_result)
+    monkeypatch.setattr(utils, "get_collection", lambda name, refresh=False: collection)
+    monkeypatch.setattr(utils, "collection_fingerprint", lambda name: "v1")
+    monkeypatch.setattr(utils, "lexical_indexes", Indexes())
+    monkeypatch.setitem(config, "hybrid_candidates", 10)
+    monkeypatch.setitem(config, "hybrid_rrf_k", 60)
+    return lexical
+
+
+def test_hybrid_query_falls_back_to_vector_results(hybrid):
+    result = utils.hybrid_query("question", "bok", [0.0], 1)
+
+    assert result["ids"] == [["v1"]]
+    assert result["distances"] == [[0.1]]
+
+
+def test_hybrid_query_fuses_lexical_hits(hybrid):
+    hybrid["hits"] = [("l1", 3.0), ("v2", 1.0), ("gone", 0.5)]
+
+    result = utils.hybrid_query("question", "bok", [0.0], 4)
+
+    assert result["ids"] == [["v2", "v1", "l1"]]
+    # lexical-only documents are fetched and get the worst vector distance
+    assert result["documents"][0][2] == "lexical one"
+    assert result["distances"] == [[0.4, 0.1, 0.4]]
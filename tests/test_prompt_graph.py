@@ -0,0 +1,222 @@
+import asyncio
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from models import model_registry
+from prompt_graph import PromptGraph
+from prompt_graph import prompt_graph as prompt_graph_module
+
+EXAMPLE_GRAPH = Path(__file__).parent.parent / "prompt_graph" / "prompt.graph.expert.example.json"
+
+
+class SlowChatModel(BaseChatModel):
+    """Chat model answering after a delay and recording how many calls overlap."""
+
+    delay: float = 0.05
+    running: int = 0
+    max_running: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        field = "draft" if "draft" in messages[-1].content else "summary"
+        content = json.dumps({field: "text"})
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+def answer_node(name: str, input_variables, output_field: str = "answer", **options):
+    return {
+        "name": name,
+        "input_variables": input_variables,
+        "prompt": f"Write the {output_field} for: {{question}}\n\n{{format_instructions}}",
+        "output": {
+            "title": "Answer",
+            "type": "object",
+            "properties": [{"name": output_field, "type": "string"}],
+            "required": [output_field],
+        },
+        **options,
+    }
+
+
+def state_schema(*fields):
+    return {
+        "title": "State",
+        "type": "object",
+        "properties": [{"name": "question", "type": "string"}] + [
+            {"name": field, "type": "string", "optional": True} for field in fields
+        ],
+    }
+
+
+def edges_of(compiled):
+    return {(edge.source, edge.target) for edge in compiled.get_graph().edges}
+
+
+def test_compile_falls_back_to_declared_edges_for_shared_output_fields():
+    graph = PromptGraph.from_dict({
+        "scheduling": "dependencies",
+        "nodes": [answer_node("draft", ["question"]), answer_node("review", ["question"])],
+        "edges": [
+            {"from": "START", "to": "draft"},
+            {"from": "draft", "to": "review"},
+            {"from": "review", "to": "END"},
+        ],
+        "state": state_schema("answer"),
+    })
+
+    assert ("draft", "review") in edges_of(graph.compile())
+
+
+def test_independent_nodes_fan_out():
+    model = SlowChatModel()
+    model_registry.register("slow", model)
+    graph = PromptGraph.from_dict({
+        "scheduling": "dependencies",
+        "nodes": [
+            answer_node("draft", ["question"], "draft", model="slow"),
+            answer_node("summarise", ["question"], "summary", model="slow"),
+        ],
+        "edges": [
+            {"from": "START", "to": "draft"},
+            {"from": "draft", "to": "summarise"},
+            {"from": "summarise", "to": "END"},
+        ],
+        "state": state_schema("draft", "summary"),
+    })
+    compiled = graph.compile(use_async=True)
+
+    result = asyncio.run(compiled.ainvoke({"question": "what?"}))
+
+    assert {("__start__", "draft"), ("__start__", "summarise")} <= edges_of(compiled)
+    assert result["draft"] == result["summary"] == "text"
+    assert model.max_running == 2
+
+
+def test_special_node_outputs_are_dependencies():
+    data = json.loads(EXAMPLE_GRAPH.read_text())
+    answer = next(node for node in data["nodes"] if node["name"] == "answer_question")
+    # retrieve writes combined_knowledge_docs without declaring it in its output schema
+    answer["input_variables"] = [
+        "combined_knowledge_docs" if var == "knowledge_docs" else var
+        for var in answer["input_variables"]
+    ]
+
+    dependencies = PromptGraph.from_dict(data).infer_dependencies()
+
+    assert dependencies["answer_question"] == {"check_input", "retrieve"}
+
+
+def test_special_nodes_with_unknown_outputs_keep_their_declared_edges():
+    graph = PromptGraph.from_dict({
+        "scheduling": "dependencies",
+        "nodes": [{"name": "lookup"}, answer_node("draft", ["question"], "draft")],
+        "edges": [
+            {"from": "START", "to": "lookup"},
+            {"from": "lookup", "to": "draft"},
+            {"from": "draft", "to": "END"},
+        ],
+        "state": state_schema("draft"),
+    })
+    graph.special_nodes = {**graph.special_nodes, "lookup": lambda state: {"question": "q"}}
+
+    assert graph.infer_dependencies() == {"lookup": set(), "draft": {"lookup"}}
+    assert ("lookup", "draft") in edges_of(graph.compile())
+
+
+def retrieval_graph(**options):
+    model_registry.register("slow", SlowChatModel())
+    knowledge_field = {"name": "knowledge_docs", "type": "object", "optional": True}
+    schema = state_schema("bok_id", "rephrased_question", "draft")
+    schema["properties"].append(knowledge_field)
+    return PromptGraph.from_dict({
+        "nodes": [
+            {"name": "retrieve", "input_variables": ["rephrased_question", "bok_id"]},
+            answer_node(
+                "answer", ["question", "knowledge_docs"], "draft", model="slow",
+                prompt="Write the draft from {knowledge_docs}: {question}\n\n{format_instructions}",
+            ),
+        ],
+        "edges": [
+            {"from": "START", "to": "retrieve"},
+            {"from": "retrieve", "to": "answer"},
+            {"from": "answer", "to": "END"},
+        ],
+        "state": schema,
+        **options,
+    })
+
+
+@pytest.fixture
+def knowledge(monkeypatch):
+    """Serve retrieval from a coroutine and fail the blocking variant."""
+    queries = []
+
+    async def aload_knowledge(query, bok_id):
+        queries.append((query, bok_id))
+        return {"documents": [["doc"]], "metadatas": [[{"source": "s"}]]}
+
+    def load_knowledge(query, bok_id):
+        raise AssertionError("the async graph must not call the blocking retrieval")
+
+    monkeypatch.setattr(prompt_graph_module, "aload_knowledge", aload_knowledge)
+    monkeypatch.setattr(prompt_graph_module, "load_knowledge", load_knowledge)
+    monkeypatch.setattr(prompt_graph_module, "combine_documents", lambda docs: "doc")
+    return queries
+
+
+def test_async_graph_retrieves_with_aretrieve(knowledge):
+    compiled = retrieval_graph().compile(use_async=True)
+
+    result = asyncio.run(compiled.ainvoke(
+        {"question": "what?", "bok_id": "bok", "rephrased_question": "what is it?"}
+    ))
+
+    assert knowledge == [("what is it?", "bok")]
+    assert result["draft"] == "text"
+
+
+def test_async_graph_offloads_blocking_special_nodes(knowledge):
+    graph = retrieval_graph()
+    threads = []
+    loops = []
+    loop_ticks = []
+
+    def lookup(state):
+        threads.append(threading.current_thread())
+        # the event loop keeps running while the blocking node waits
+        ticked = threading.Event()
+        loops[0].call_soon_threadsafe(lambda: (loop_ticks.append(1), ticked.set()))
+        assert ticked.wait(timeout=5)
+        return {}
+
+    graph.special_nodes = {"retrieve": lookup}
+    graph.async_special_nodes = {}
+    compiled = graph.compile(use_async=True)
+
+    async def run():
+        loops.append(asyncio.get_running_loop())
+        return await compiled.ainvoke({"question": "what?", "bok_id": "bok"})
+
+    result = asyncio.run(run())
+
+    assert threads and threads[0] is not threading.main_thread()
+    assert loop_ticks == [1]
+    assert knowledge == []
+    assert result["draft"] == "text"
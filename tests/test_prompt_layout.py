@@ -0,0 +1,87 @@
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from prompt_graph.prompt_layout import (
+    INLINE,
+    PREFIX_CACHE,
+    PREFIX_VARIABLES,
+    build_node_prompt,
+    split_prompt,
+)
+
+EXAMPLE_GRAPH = Path(__file__).parent.parent / "prompt_graph" / "prompt.graph.expert.example.json"
+LLM_NODES = [
+    node for node in json.loads(EXAMPLE_GRAPH.read_text())["nodes"] if node.get("prompt")
+]
+
+
+def render(node, layout):
+    prompt = build_node_prompt(node["prompt"], layout, append_instructions=True)
+    values = {name: f"<{name}>" for name in prompt.input_variables}
+    values["format_instructions"] = "<SCHEMA>"
+    return prompt.format_messages(**values)
+
+
+def introducing_text(prompt: str, variable: str) -> str:
+    """The text introducing a variable: the rest of its line, or the line before it."""
+    before = prompt[:prompt.index("{" + variable + "}")]
+    lines = before.split("\n")
+    if lines[-1].strip():
+        return lines[-1]
+    return lines[-2] + "\n"
+
+
+@pytest.mark.parametrize("node", LLM_NODES, ids=[node["name"] for node in LLM_NODES])
+def test_prefix_layout_keeps_labels_and_delimiters_with_their_variables(node):
+    system, human = render(node, PREFIX_CACHE)
+
+    assert system.type == "system"
+    assert "<SCHEMA>" in system.content
+    assert "<SCHEMA>" not in human.content
+    for variable in re.findall(r"\{(\w+)\}", node["prompt"]):
+        if variable in PREFIX_VARIABLES:
+            continue
+        value = f"<{variable}>"
+        assert value not in system.content
+        assert introducing_text(node["prompt"], variable) + value in human.content
+
+
+def test_prefix_layout_keeps_knowledge_inside_its_delimiters():
+    node = next(node for node in LLM_NODES if node["name"] == "answer_question")
+
+    system, human = render(node, PREFIX_CACHE)
+
+    assert "+++" not in system.content
+    assert "+++\n<knowledge_docs>\n+++" in human.content
+    assert "<display_name>" in system.content
+
+
+def test_inline_layout_appends_missing_instructions():
+    (message,) = render({"prompt": "Question: {question}"}, INLINE)
+
+    assert message.content == "Question: <question>\n\nOutput format instructions: <SCHEMA>"
+
+
+def test_split_prompt_keeps_the_introducing_paragraph():
+    template = "Static rules.\n\nYou are given:\n\nQuestion: {question}\n\nAnswer."
+
+    assert split_prompt(template) == (
+        "Static rules.",
+        "You are given:\n\nQuestion: {question}\n\nAnswer.",
+    )
+
+
+def test_split_prompt_keeps_persona_variables_and_escaped_braces_in_the_prefix():
+    template = "You are {display_name}, reply with {{json}}.\n\nQuestion: {question}"
+
+    assert split_prompt(template) == (
+        "You are {display_name}, reply with {{json}}.",
+        "Question: {question}",
+    )
+
+
+def test_split_prompt_without_per_request_variables():
+    assert split_prompt("You are {display_name}.") == ("You are {display_name}.", "")
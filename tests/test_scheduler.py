@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from scheduler import RequestScheduler, SchedulerOverloaded
+
+
+class Handler:
+    """Request handler that blocks until released and records running requests."""
+
+    def __init__(self):
+        self.started = []
+        self.running = {}
+        self.max_running = {}
+        self.releases = {}
+
+    def __call__(self, persona_id: str, name: str):
+        async def handle():
+            self.started.append(name)
+            self.running[persona_id] = self.running.get(persona_id, 0) + 1
+            self.max_running[persona_id] = max(
+                self.max_running.get(persona_id, 0), self.running[persona_id]
+            )
+            self.releases[name] = asyncio.Event()
+            await self.releases[name].wait()
+            self.running[persona_id] -= 1
+            return name
+        return handle
+
+    async def release(self, name: str):
+        self.releases[name].set()
+        # let the released request finish and the next one be granted its slot
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_per_persona_cap():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrency=10, max_per_persona=2, max_wait_seconds=5)
+        handler = Handler()
+        tasks = [
+            asyncio.create_task(scheduler.run("a", handler("a", f"a{index}")))
+            for index in range(5)
+        ]
+        await settle()
+        assert handler.started == ["a0", "a1"]
+        assert scheduler.stats() == {"running": 2, "waiting": 3, "personas_waiting": 1}
+
+        for index in range(5):
+            await handler.release(f"a{index}")
+        assert await asyncio.gather(*tasks) == [f"a{index}" for index in range(5)]
+        assert handler.max_running["a"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_free_slots_rotate_across_personas():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrency=1, max_per_persona=1, max_wait_seconds=5)
+        handler = Handler()
+        tasks = [asyncio.create_task(scheduler.run("a", handler("a", "a0")))]
+        await settle()
+        # a busy persona queues several requests before another persona arrives
+        tasks += [
+            asyncio.create_task(scheduler.run("a", handler("a", name))) for name in ("a1", "a2")
+        ]
+        await settle()
+        tasks += [
+            asyncio.create_task(scheduler.run("b", handler("b", name))) for name in ("b0", "b1")
+        ]
+        await settle()
+
+        for name in ("a0", "a1", "b0", "a2", "b1"):
+            await handler.release(name)
+        await asyncio.gather(*tasks)
+
+        assert handler.started == ["a0", "a1", "b0", "a2", "b1"]
+
+    asyncio.run(scenario())
+
+
+def test_sheds_requests_waiting_past_the_deadline():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrency=1, max_per_persona=1, max_wait_seconds=0.05)
+        handler = Handler()
+        running = asyncio.create_task(scheduler.run("a", handler("a", "a0")))
+        await settle()
+
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.run("b", handler("b", "b0"))
+
+        assert scheduler.stats() == {"running": 1, "waiting": 0, "personas_waiting": 0}
+        await handler.release("a0")
+        await running
+        assert handler.started == ["a0"]
+        assert scheduler.stats()["running"] == 0
+
+    asyncio.run(scenario())
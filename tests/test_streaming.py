@@ -0,0 +1,229 @@
+import asyncio
+import json
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+import streaming
+from models import model_registry
+from prompt_graph import PromptGraph
+from streaming import ResultChunkPublisher, astream_graph
+
+
+class Reply:
+    """Scripted reply of one LLM call: streamed in pieces, optionally failing midway."""
+
+    def __init__(self, answer: str, delay: float = 0.0, fail_after: Optional[int] = None):
+        self.content = json.dumps({"final_answer": answer})
+        self.delay = delay
+        self.fail_after = fail_after
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model answering the calls in order with the scripted replies."""
+
+    replies: List[Any]
+    chunk_size: int = 8
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _chunk(self, piece: str, tools, first: bool) -> AIMessageChunk:
+        if not tools:
+            return AIMessageChunk(content=piece)
+        name = tools[0]["function"]["name"]
+        return AIMessageChunk(content="", tool_call_chunks=[{
+            "name": name if first else None, "args": piece, "id": "call-0", "index": 0,
+        }])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        reply = self.replies.pop(0)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply.content))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        reply = self.replies.pop(0)
+        pieces = [
+            reply.content[index:index + self.chunk_size]
+            for index in range(0, len(reply.content), self.chunk_size)
+        ]
+        for index, piece in enumerate(pieces):
+            if reply.fail_after is not None and index == reply.fail_after:
+                raise RuntimeError("connection reset")
+            await asyncio.sleep(reply.delay)
+            yield ChatGenerationChunk(message=self._chunk(piece, tools, index == 0))
+
+
+def make_graph(replies: List[Reply], **graph_options) -> Any:
+    model_registry.register("scripted", ScriptedChatModel(replies=replies))
+    return PromptGraph.from_dict({
+        "nodes": [{
+            "name": "answer",
+            "input_variables": ["question"],
+            "prompt": "Answer the question: {question}\n\n{format_instructions}",
+            "model": "scripted",
+            "output": {
+                "title": "Answer",
+                "type": "object",
+                "properties": [{"name": "final_answer", "type": "string"}],
+                "required": ["final_answer"],
+            },
+        }],
+        "edges": [{"from": "START", "to": "answer"}, {"from": "answer", "to": "END"}],
+        "state": {
+            "title": "State",
+            "type": "object",
+            "properties": [
+                {"name": "question", "type": "string"},
+                {"name": "final_answer", "type": "string", "optional": True},
+            ],
+        },
+        **graph_options,
+    }).compile(use_async=True)
+
+
+async def stream(graph):
+    chunks = []
+
+    async def on_chunk(text, replace=False):
+        chunks.append((text, replace))
+
+    result = await astream_graph(graph, {"question": "what?"}, {"answer"}, on_chunk)
+    return result, chunks
+
+
+def rendered(chunks) -> str:
+    """The answer as a client applying the chunks and replace markers shows it."""
+    text = ""
+    for chunk, replace in chunks:
+        text = chunk if replace else text + chunk
+    return text
+
+
+def test_streams_answer():
+    graph = make_graph([Reply("a streamed answer")])
+
+    result, chunks = asyncio.run(stream(graph))
+
+    assert result["final_answer"] == "a streamed answer"
+    assert len(chunks) > 1
+    assert not any(replace for _, replace in chunks)
+    assert rendered(chunks) == "a streamed answer"
+
+
+def test_retry_resets_streamed_answer():
+    graph = make_graph(
+        [Reply("the slow first attempt", delay=0.05), Reply("the retried answer")],
+        policy={"timeout": 0.2, "max_retries": 1, "backoff": 0},
+    )
+
+    result, chunks = asyncio.run(stream(graph))
+
+    assert result["final_answer"] == "the retried answer"
+    assert ("", True) in chunks
+    assert rendered(chunks) == "the retried answer"
+
+
+def test_hedge_win_replaces_streamed_answer():
+    graph = make_graph(
+        [Reply("the slow primary answer, still going on", delay=0.03), Reply("the hedged answer")],
+        policy={"hedge": True, "hedge_delay": 0.15},
+    )
+
+    result, chunks = asyncio.run(stream(graph))
+
+    assert result["final_answer"] == "the hedged answer"
+    # the hedge itself is not streamed, the final answer replaces the primary's text
+    assert chunks[-1] == ("the hedged answer", True)
+    assert rendered(chunks) == "the hedged answer"
+
+
+def test_structured_failure_mid_stream_streams_fallback():
+    graph = make_graph(
+        [Reply("the failed structured answer", fail_after=4), Reply("the fallback answer")],
+        output_mode="structured",
+    )
+
+    result, chunks = asyncio.run(stream(graph))
+
+    assert result["final_answer"] == "the fallback answer"
+    assert chunks[0][0] and not chunks[0][1]
+    assert ("", True) in chunks
+    assert rendered(chunks) == "the fallback answer"
+
+
+class FakeInput:
+    def model_dump(self, exclude=None):
+        return {"persona_id": "persona"}
+
+
+class FakeExchange:
+    def __init__(self):
+        self.published = []
+        self.routes = []
+
+    async def publish(self, message, routing_key):
+        self.published.append(json.loads(message.body))
+        self.routes.append((routing_key, message.type))
+
+
+class FakeChannel:
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    async def get_exchange(self, name, ensure=True):
+        return self.exchange
+
+    async def declare_exchange(self, *args, **kwargs):
+        raise AssertionError("the event bus exchange is declared by the engine")
+
+
+class FakeConnection:
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    async def channel(self):
+        return FakeChannel(self.exchange)
+
+
+def test_publisher_connects_once_for_concurrent_chunks(monkeypatch):
+    exchange = FakeExchange()
+    connections = []
+
+    async def connect_robust(**kwargs):
+        await asyncio.sleep(0.01)
+        connections.append(FakeConnection(exchange))
+        return connections[-1]
+
+    monkeypatch.setattr(streaming.aio_pika, "connect_robust", connect_robust)
+    on_chunk = ResultChunkPublisher().for_input(FakeInput())
+
+    async def publish():
+        await asyncio.gather(on_chunk("first"), on_chunk("second"), on_chunk("", replace=True))
+
+    asyncio.run(publish())
+
+    assert len(connections) == 1
+    assert [body["response"]["sequence"] for body in exchange.published] == [0, 1, 2]
+    assert exchange.published[2]["response"]["replace"] is True
+
+
+def test_publisher_routes_chunks_apart_from_results(monkeypatch):
+    exchange = FakeExchange()
+
+    async def connect_robust(**kwargs):
+        return FakeConnection(exchange)
+
+    monkeypatch.setattr(streaming.aio_pika, "connect_robust", connect_robust)
+    monkeypatch.setitem(streaming.config, "rabbitmq_result_routing_key", "result")
+    monkeypatch.setitem(streaming.config, "rabbitmq_chunk_routing_key", "result-chunk")
+
+    asyncio.run(ResultChunkPublisher().for_input(FakeInput())("first"))
+
+    assert exchange.routes == [("result-chunk", streaming.CHUNK_MESSAGE_TYPE)]
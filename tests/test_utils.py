@@ -0,0 +1,143 @@
+import pytest
+
+import utils
+from cache import LRUCache
+from config import config, parse_retrieval_collections
+
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    """Record the documents fetched per collection and the re-ranker's top_k."""
+    calls = {"fetched": {}, "rerank_top_k": None, "packed": False}
+
+    def load_documents(query, collection_name, num_docs=4, embedding=None):
+        calls["fetched"][collection_name] = num_docs
+        return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+    def load_collections(query, collections, embedding=None):
+        calls["fetched"].update(collections)
+        return {}
+
+    def rerank_documents(query, docs, top_k, lexical_weight):
+        calls["rerank_top_k"] = top_k
+        return docs
+
+    def pack_documents(docs, token_budget, truncate):
+        calls["packed"] = True
+        return docs
+
+    monkeypatch.setattr(utils, "load_documents", load_documents)
+    monkeypatch.setattr(utils, "load_collections", load_collections)
+    monkeypatch.setattr(utils, "rerank_documents", rerank_documents)
+    monkeypatch.setattr(utils, "pack_documents", pack_documents)
+    monkeypatch.setitem(config, "retrieval_collections", [("{bok_id}-knowledge", 4)])
+    monkeypatch.setitem(config, "context_candidate_factor", 3)
+    monkeypatch.setitem(config, "rerank_candidates", 20)
+    return calls
+
+
+@pytest.mark.parametrize(
+    "rerank_enabled, token_budget, fetched, rerank_top_k",
+    [
+        (False, 0, 4, None),
+        (False, 1000, 12, None),
+        (True, 0, 20, 4),
+        (True, 1000, 20, 12),
+    ],
+)
+def test_load_knowledge_over_fetch(
+    monkeypatch, retrieval, rerank_enabled, token_budget, fetched, rerank_top_k
+):
+    monkeypatch.setitem(config, "rerank_enabled", rerank_enabled)
+    monkeypatch.setitem(config, "context_token_budget", token_budget)
+
+    utils.load_knowledge("question", "bok", embedding=[0.0])
+
+    assert retrieval["fetched"] == {"bok-knowledge": fetched}
+    assert retrieval["rerank_top_k"] == rerank_top_k
+    assert retrieval["packed"] == bool(token_budget)
+
+
+def test_load_knowledge_rerank_candidates_below_packer_candidates(monkeypatch, retrieval):
+    monkeypatch.setitem(config, "rerank_enabled", True)
+    monkeypatch.setitem(config, "rerank_candidates", 5)
+    monkeypatch.setitem(config, "context_token_budget", 1000)
+
+    utils.load_knowledge("question", "bok", embedding=[0.0])
+
+    # never fewer candidates than the packer chooses from
+    assert retrieval["fetched"] == {"bok-knowledge": 12}
+
+
+def test_load_knowledge_splits_candidates_by_quota(monkeypatch, retrieval):
+    monkeypatch.setitem(
+        config, "retrieval_collections", [("{bok_id}-knowledge", 3), ("{bok_id}-context", 1)]
+    )
+    monkeypatch.setitem(config, "rerank_enabled", True)
+    monkeypatch.setitem(config, "context_token_budget", 1000)
+
+    utils.load_knowledge("question", "bok", embedding=[0.0])
+
+    assert retrieval["fetched"] == {"bok-knowledge": 15, "bok-context": 5}
+
+
+@pytest.mark.parametrize(
+    "value", ["{bok_id}-knowledge", "{bok_id}-knowledge:four", "{bok_id}-knowledge:0", "{kb}:4"]
+)
+def test_parse_retrieval_collections_rejects_malformed_entries(value):
+    with pytest.raises(ValueError, match="Invalid RETRIEVAL_COLLECTIONS entry"):
+        parse_retrieval_collections(value)
+
+
+def test_parse_retrieval_collections():
+    assert parse_retrieval_collections("{bok_id}-knowledge:4, {bok_id}-context:2") == [
+        ("{bok_id}-knowledge", 4),
+        ("{bok_id}-context", 2),
+    ]
+
+
+class FakeCollection:
+    def __init__(self, collection_id, documents, metadata=None):
+        self.id = collection_id
+        self.documents = documents
+        self.metadata = metadata
+
+    def get(self, include=None, limit=None, offset=0):
+        ids = list(self.documents)[offset:offset + limit]
+        return {"ids": ids, "metadatas": [self.documents[document_id] for document_id in ids]}
+
+
+@pytest.fixture
+def fingerprinted(monkeypatch):
+    collection = FakeCollection("c1", {"d0": {"source": "a"}}, {"ingested_at": "monday"})
+    monkeypatch.setattr(utils, "get_collection", lambda name, refresh=False: collection)
+    monkeypatch.setattr(utils, "collection_fingerprints", LRUCache(0))
+    monkeypatch.setattr(utils, "FINGERPRINT_PAGE_SIZE", 2)
+    return collection
+
+
+def test_collection_fingerprint_changes_with_the_documents(fingerprinted):
+    before = utils.collection_fingerprint("bok-knowledge")
+    fingerprinted.documents.update({"d1": {"source": "b"}, "d2": {"source": "c"}})
+
+    assert utils.collection_fingerprint("bok-knowledge") != before
+    assert utils.collection_fingerprint("bok-knowledge").startswith("c1:")
+
+
+def test_collection_fingerprint_changes_on_in_place_re_ingest(fingerprinted):
+    before = utils.collection_fingerprint("bok-knowledge")
+
+    fingerprinted.metadata = {"ingested_at": "tuesday"}
+    assert utils.collection_fingerprint("bok-knowledge") != before
+
+    fingerprinted.metadata = {"ingested_at": "monday"}
+    fingerprinted.documents["d0"] = {"source": "a", "title": "edited"}
+    assert utils.collection_fingerprint("bok-knowledge") != before
+
+
+def test_collection_fingerprint_is_reused_within_its_ttl(monkeypatch, fingerprinted):
+    monkeypatch.setattr(utils, "collection_fingerprints", LRUCache(8))
+    before = utils.collection_fingerprint("bok-knowledge")
+    fingerprinted.metadata = {"ingested_at": "tuesday"}
+
+    assert utils.collection_fingerprint("bok-knowledge") == before
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+import warmup
+from config import config
+
+
+@pytest.fixture
+def warmed(monkeypatch):
+    """Record the graphs the model and compile steps were given."""
+    calls = {"models": [], "compiled": []}
+
+    async def warm_models(graph):
+        calls["models"].append(graph)
+
+    async def compile_graph(graph):
+        calls["compiled"].append(graph)
+
+    async def noop():
+        pass
+
+    monkeypatch.setattr(warmup, "warm_models", warm_models)
+    monkeypatch.setattr(warmup, "compile_graph", compile_graph)
+    monkeypatch.setattr(warmup, "warm_embeddings", noop)
+    monkeypatch.setattr(warmup, "warm_vector_db", noop)
+    return calls
+
+
+@pytest.mark.parametrize("content", [None, "{not json", "[]"])
+def test_unloadable_graph_skips_the_graph_steps(monkeypatch, tmp_path, warmed, content):
+    path = tmp_path / "graph.json"
+    if content is not None:
+        path.write_text(content)
+    monkeypatch.setitem(config, "warmup_graph_path", str(path))
+    timer = warmup.StartupTimer()
+
+    asyncio.run(warmup.warm_up(timer))
+
+    assert warmed == {"models": [None], "compiled": []}
+    assert "graph_compile" not in timer.steps
+    assert {"graph_load", "llm", "embeddings", "vector_db"} <= set(timer.steps)
+
+
+def test_loaded_graph_is_compiled(monkeypatch, tmp_path, warmed):
+    path = tmp_path / "graph.json"
+    path.write_text('{"nodes": []}')
+    monkeypatch.setitem(config, "warmup_graph_path", str(path))
+
+    asyncio.run(warmup.warm_up(warmup.StartupTimer()))
+
+    assert warmed == {"models": [{"nodes": []}], "compiled": [{"nodes": []}]}
@@ -1,13 +1,47 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 from alkemio_virtual_contributor_engine import (
     chromadb_client,
-    openai_embeddings,
     setup_logger,
-    clear_tags,
-    HistoryItem
 )
+from cache import LRUCache
+from config import config, vectordb_path
+from context_packer import pack_documents
+from embeddings import embed_query
+from instrumentation import timed
+from lexical_index import LexicalIndexManager, reciprocal_rank_fusion
+from reranker import rerank_documents
 
 logger = setup_logger(__name__)
 
+# collection handles keyed by collection name, e.g. `{bok_id}-knowledge`
+collection_handles = LRUCache(
+    config["collection_cache_size"], config["collection_cache_ttl"] or None
+)
+
+# content fingerprints keyed by collection name, a zero ttl recomputes them on every call
+collection_fingerprints = LRUCache(
+    config["collection_cache_size"] if config["collection_fingerprint_ttl"] else 0,
+    config["collection_fingerprint_ttl"] or None,
+)
+FINGERPRINT_PAGE_SIZE = 1000
+
+# queries the collections of a multi-collection retrieval concurrently
+collection_query_executor = ThreadPoolExecutor(thread_name_prefix="collection-query")
+
+# BM25 indexes of the collections, only kept when hybrid search is used
+lexical_indexes = None
+if config["hybrid_search_enabled"]:
+    lexical_indexes = LexicalIndexManager(
+        os.path.join(vectordb_path, "lexical"),
+        config["lexical_index_page_size"],
+        config["collection_cache_size"],
+    )
+
 
 def log_docs(docs, purpose):
     if docs and "ids" in docs and docs["ids"] and docs["ids"][0]:
@@ -16,24 +50,6 @@ def log_docs(docs, purpose):
         logger.debug(f"{purpose} documents: {docs}")
 
 
-def history_as_conversation(history: list[HistoryItem]):
-    return "\n".join(list(map(
-        lambda message: f"{message.role}: {clear_tags(message.content)}",
-        history
-    )))
-
-
-def history_as_dict(history: list[HistoryItem]):
-    return list(
-        map(
-            lambda history_item: {
-                "role": history_item.role,
-                "content": clear_tags(history_item.content)
-            },
-            history
-        )
-    )
-
 # def load_context(query, contextId):
 #     collection_name = f"{contextId}-context"
 #     docs = load_documents(query, collection_name)
@@ -42,24 +58,129 @@ def history_as_dict(history: list[HistoryItem]):
 #
 
 
-def load_knowledge(query, knowledgeId):
-    collection_name = f"{knowledgeId}-knowledge"
-    docs = load_documents(query, collection_name)
+def knowledge_collection_name(knowledgeId):
+    return f"{knowledgeId}-knowledge"
+
+
+def retrieval_collections(knowledgeId):
+    """Return the (collection name, quota) pairs queried for a body of knowledge.
+
+    Configured with RETRIEVAL_COLLECTIONS as comma separated `template:quota`
+    entries, where the template may refer to `{bok_id}`.
+    """
+    return [
+        (template.format(bok_id=knowledgeId), quota)
+        for template, quota in config["retrieval_collections"]
+    ]
+
+
+def load_knowledge(query, knowledgeId, embedding=None):
+    collections = retrieval_collections(knowledgeId)
+    quotas_total = sum(quota for _, quota in collections)
+    top_k = quotas_total
+    token_budget = config["context_token_budget"]
+    if token_budget:
+        # over-fetch so the packer can choose the best chunks fitting the budget
+        top_k *= config["context_candidate_factor"]
+    candidates = top_k
+    if config["rerank_enabled"]:
+        # over-fetch candidates for the re-ranker, which keeps the top_k best of them
+        candidates = max(config["rerank_candidates"], top_k)
+    if candidates != quotas_total:
+        # split the candidates in proportion to the quotas
+        factor = candidates / quotas_total
+        collections = [
+            (collection_name, math.ceil(quota * factor)) for collection_name, quota in collections
+        ]
+    if len(collections) == 1:
+        collection_name, num_docs = collections[0]
+        docs = load_documents(query, collection_name, num_docs, embedding=embedding)
+    else:
+        docs = load_collections(query, collections, embedding=embedding)
+    if config["rerank_enabled"]:
+        with timed("rerank"):
+            docs = rerank_documents(query, docs, top_k, config["rerank_lexical_weight"])
+    if token_budget:
+        docs = pack_documents(docs, token_budget, config["context_truncate"])
     log_docs(docs, "Knowledge")
     return docs
 
 
-def load_documents(query, collection_name, num_docs=4):
-    try:
-        collection = chromadb_client.get_collection(
+async def aload_knowledge(query, knowledgeId, embedding=None):
+    # the chroma and embeddings clients are blocking, keep them off the event loop
+    return await asyncio.to_thread(load_knowledge, query, knowledgeId, embedding)
+
+
+def get_collection(collection_name, refresh=False):
+    if refresh:
+        collection_handles.pop(collection_name)
+    return collection_handles.get_or_create(
+        collection_name,
+        lambda: chromadb_client.get_collection(
             collection_name,
             embedding_function=None  # chroma_openai_embeddings
+        ),
+    )
+
+
+def collection_fingerprint(collection_name):
+    """Identify the current contents of a collection; changes when it is re-ingested.
+
+    Hashes the collection metadata, where ingestion records when it last wrote
+    the collection, together with the ids and metadata of its documents, so
+    an in-place re-ingest changes the fingerprint even when the number of
+    documents stays the same. Cached for `collection_fingerprint_ttl` seconds.
+    """
+    return collection_fingerprints.get_or_create(
+        collection_name, lambda: _hash_collection(collection_name)
+    )
+
+
+def _hash_collection(collection_name):
+    # re-fetch the handle, the cached one holds the metadata of when it was fetched
+    collection = get_collection(collection_name, refresh=True)
+    digest = hashlib.sha256(
+        json.dumps(getattr(collection, "metadata", None), sort_keys=True, default=str).encode()
+    )
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=FINGERPRINT_PAGE_SIZE, offset=offset)
+        digest.update(
+            json.dumps([page["ids"], page["metadatas"]], sort_keys=True, default=str).encode()
         )
-        embeddings = openai_embeddings.embed_documents([query])
-        result = collection.query(
-            query_embeddings=list(embeddings), n_results=num_docs
+        if len(page["ids"]) < FINGERPRINT_PAGE_SIZE:
+            return f"{collection.id}:{digest.hexdigest()}"
+        offset += FINGERPRINT_PAGE_SIZE
+
+
+def query_collection(collection_name, query_embeddings, n_results):
+    collection = get_collection(collection_name)
+    try:
+        return collection.query(query_embeddings=query_embeddings, n_results=n_results)
+    except Exception as inst:
+        # the collection may have been dropped or re-ingested since the handle was cached
+        logger.warning(
+            f"Query on cached collection {collection_name} failed ({inst}), refreshing handle"
+        )
+        collection = get_collection(collection_name, refresh=True)
+        return collection.query(query_embeddings=query_embeddings, n_results=n_results)
+
+
+def load_documents(query, collection_name, num_docs=4, embedding=None):
+    try:
+        # resolve the collection first so missing collections fail before embedding
+        get_collection(collection_name)
+        if embedding is None:
+            with timed("embedding"):
+                embedding = embed_query(query)
+        if config["hybrid_search_enabled"]:
+            result = hybrid_query(query, collection_name, embedding, num_docs)
+        else:
+            with timed("vector_query"):
+                result = query_collection(collection_name, [embedding], num_docs)
+        logger.debug(
+            f"Query result keys: {result.keys() if hasattr(result, 'keys') else type(result)}"
         )
-        logger.debug(f"Query result keys: {result.keys() if hasattr(result, 'keys') else type(result)}")
         return result
     except Exception as inst:
         logger.error(
@@ -69,6 +190,121 @@ def load_documents(query, collection_name, num_docs=4):
         return {}
 
 
+def hybrid_query(query, collection_name, embedding, num_docs):
+    """Fuse vector and BM25 results of a collection with reciprocal rank fusion.
+
+    Falls back to the vector results alone while the collection's lexical
+    index is being built. Documents found only by the lexical index keep the
+    largest distance of the vector results, so they rank last when results
+    of several collections are merged by distance.
+    """
+    candidates = max(num_docs, config["hybrid_candidates"])
+    with timed("vector_query"):
+        vector_result = query_collection(collection_name, [embedding], candidates)
+    with timed("lexical_query"):
+        lexical_hits = lexical_indexes.search(
+            collection_name,
+            get_collection(collection_name),
+            collection_fingerprint(collection_name),
+            query,
+            candidates,
+        )
+
+    rows = {}
+    if vector_result and vector_result.get("ids") and vector_result["ids"][0]:
+        rows = {
+            document_id: (document, metadata, distance)
+            for document_id, document, metadata, distance in zip(
+                vector_result["ids"][0],
+                vector_result["documents"][0],
+                vector_result["metadatas"][0],
+                vector_result["distances"][0],
+            )
+        }
+    if not lexical_hits:
+        return {
+            key: [vector_result[key][0][:num_docs]]
+            for key in ("ids", "documents", "metadatas", "distances")
+            if vector_result.get(key)
+        }
+
+    fused = reciprocal_rank_fusion(
+        [list(rows), [document_id for document_id, _ in lexical_hits]], config["hybrid_rrf_k"]
+    )
+    selected = [document_id for document_id, _ in fused[:num_docs]]
+    missing = [document_id for document_id in selected if document_id not in rows]
+    if missing:
+        worst_distance = max((row[2] for row in rows.values()), default=1.0)
+        fetched = get_collection(collection_name).get(
+            ids=missing, include=["documents", "metadatas"]
+        )
+        for document_id, document, metadata in zip(
+            fetched["ids"], fetched["documents"], fetched["metadatas"]
+        ):
+            rows[document_id] = (document, metadata, worst_distance)
+    # ids deleted from the collection since the index was built are dropped
+    selected = [document_id for document_id in selected if document_id in rows]
+    return {
+        "ids": [selected],
+        "documents": [[rows[document_id][0] for document_id in selected]],
+        "metadatas": [[rows[document_id][1] for document_id in selected]],
+        "distances": [[rows[document_id][2] for document_id in selected]],
+    }
+
+
+def load_collections(query, collections, embedding=None):
+    """Query several collections with one query embedding and merge the results.
+
+    Args:
+        query: The question to retrieve documents for
+        collections: List of (collection name, quota) pairs; at most quota
+                     documents are taken from each collection
+        embedding: Precomputed query embedding, if already available
+
+    Returns:
+        A single Chroma-style result ranked by distance across all collections
+    """
+    if embedding is None:
+        try:
+            with timed("embedding"):
+                embedding = embed_query(query)
+        except Exception as inst:
+            logger.error(f"Error embedding question `{query}`")
+            logger.exception(inst)
+            return {}
+
+    results = collection_query_executor.map(
+        lambda collection: load_documents(query, collection[0], collection[1], embedding=embedding),
+        collections,
+    )
+    return merge_results(list(zip(results, (quota for _, quota in collections))))
+
+
+def merge_results(results_with_quotas):
+    """Merge single-query Chroma results into one result ordered by distance."""
+    rows = []
+    for result, quota in results_with_quotas:
+        if not result or not result.get("ids") or not result["ids"][0]:
+            continue
+        distances = (result.get("distances") or [[]])[0] or [0.0] * len(result["ids"][0])
+        rows.extend(list(zip(
+            distances,
+            result["ids"][0],
+            result["documents"][0],
+            result["metadatas"][0],
+        ))[:quota])
+
+    if not rows:
+        return {}
+    rows.sort(key=lambda row: row[0])
+    return {
+        "ids": [[row[1] for row in rows]],
+        "documents": [[row[2] for row in rows]],
+        "metadatas": [[row[3] for row in rows]],
+        "distances": [[row[0] for row in rows]],
+    }
+
+
 def combine_documents(docs, document_separator="\n\n"):
     chunks_array = []
     
@@ -0,0 +1,102 @@
+"""Startup pre-warming so the first request does not pay for cold caches and connections."""
+
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from alkemio_virtual_contributor_engine import chromadb_client, openai_embeddings, setup_logger
+from config import config
+
+logger = setup_logger(__name__)
+
+WARMUP_PROMPT = "Reply with OK."
+
+
+class StartupTimer:
+    """Wall time of the startup steps, logged as one breakdown."""
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at or time.perf_counter()
+        self.steps: Dict[str, float] = {}
+
+    async def step(
+        self, name: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None
+    ) -> Any:
+        """Run a warm-up step; failures and timeouts are logged, never raised.
+
+        Returns:
+            The result of the step, or None if it failed
+        """
+        started_at = time.perf_counter()
+        try:
+            return await asyncio.wait_for(fn(), timeout)
+        except Exception as inst:
+            logger.warning(f"Startup step {name} failed: {inst!r}")
+            return None
+        finally:
+            self.steps[name] = round(time.perf_counter() - started_at, 3)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.steps[name] = round(seconds, 3)
+
+    def summary(self) -> Dict[str, float]:
+        return {**self.steps, "total": round(time.perf_counter() - self.started_at, 3)}
+
+
+def load_warmup_graph() -> Optional[Dict[str, Any]]:
+    if not config["warmup_graph_path"]:
+        return None
+    with open(config["warmup_graph_path"], encoding="utf-8") as graph_file:
+        graph = json.load(graph_file)
+    if not isinstance(graph, dict):
+        raise ValueError(f"{config['warmup_graph_path']} does not hold a prompt graph object")
+    return graph
+
+
+async def compile_graph(graph: Dict[str, Any]) -> None:
+    import ai_adapter
+    # compiled with the same key as requests sending this graph
+    await asyncio.to_thread(ai_adapter.compiled_graphs.get_or_compile, graph, True)
+
+
+async def warm_models(graph: Optional[Dict[str, Any]]) -> None:
+    """Send a minimal prompt to every model profile the graph uses."""
+    from models import model_registry
+
+    profiles = {model_registry.default}
+    if graph:
+        profiles |= {node["model"] for node in graph.get("nodes", []) if node.get("model")}
+    await asyncio.gather(
+        *(model_registry.get(profile).ainvoke(WARMUP_PROMPT) for profile in profiles)
+    )
+
+
+async def warm_embeddings() -> None:
+    await asyncio.to_thread(openai_embeddings.embed_documents, ["warm up"])
+
+
+async def warm_vector_db() -> None:
+    await asyncio.to_thread(chromadb_client.heartbeat)
+
+
+async def warm_up(timer: StartupTimer) -> None:
+    """Pre-compile the configured graph and open the LLM, embeddings and Chroma connections.
+
+    When the graph cannot be loaded only the default model profile is warmed
+    and compiling is skipped.
+    """
+    timeout = config["warmup_timeout"] or None
+    graph = None
+    if config["warmup_graph_path"]:
+        graph = await timer.step(
+            "graph_load", lambda: asyncio.to_thread(load_warmup_graph), timeout
+        )
+    steps = [
+        timer.step("llm", lambda: warm_models(graph), timeout),
+        timer.step("embeddings", warm_embeddings, timeout),
+        timer.step("vector_db", warm_vector_db, timeout),
+    ]
+    if graph is not None:
+        steps.append(timer.step("graph_compile", lambda: compile_graph(graph), timeout))
+    await asyncio.gather(*steps)